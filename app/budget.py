@@ -0,0 +1,108 @@
+"""
+Бюджеты задержки и admission control для поисковых endpoint'ов.
+
+Deadline — бюджет на один запрос: поиск проверяет его между стадиями и при
+нехватке времени деградирует (меньше кандидатов в rerank, затем скоринг без rerank;
+в поиске без rerank — меньше прочитанных страниц кандидатов).
+Выбранный путь пишется в deadline.degradation и отдаётся в метаданных ответа.
+
+AdmissionController ограничивает число одновременных запросов с работой моделей
+и длину очереди к ним: при переполнении запрос сразу получает 503, а не ждёт.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+# Бюджет задержки по endpoint'ам, мс
+LATENCY_BUDGETS_MS = {
+    "search": float(os.getenv("SEARCH_BUDGET_MS", 2000)),
+    "search_without_rerank": float(os.getenv("SEARCH_WITHOUT_RERANK_BUDGET_MS", 1000)),
+    "query": float(os.getenv("QUERY_BUDGET_MS", 2000)),
+}
+
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", 4))
+MODEL_MAX_QUEUE = int(os.getenv("MODEL_MAX_QUEUE", 16))
+
+
+class Deadline:
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        # full | reduced_rerank | no_rerank — поиск с rerank;
+        # full | truncated — поиск без rerank (выборка кандидатов прервана по бюджету)
+        self.degradation = "full"
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self) -> float:
+        return self.budget_ms - self.elapsed_ms()
+
+    def degrade(self, path: str) -> None:
+        self.degradation = path
+
+    def meta(self) -> dict:
+        return {
+            "degradation": self.degradation,
+            "budget_ms": self.budget_ms,
+            "elapsed_ms": round(self.elapsed_ms(), 1),
+        }
+
+
+def deadline_for(endpoint: str) -> Deadline:
+    return Deadline(LATENCY_BUDGETS_MS[endpoint])
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = MODEL_MAX_CONCURRENCY, max_queue: int = MODEL_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.stats = {"admitted": 0, "rejected": 0}
+
+    @contextmanager
+    def slot(self, deadline: Optional[Deadline] = None):
+        """
+        Занимает слот на работу моделей. Ждёт в очереди не дольше остатка бюджета;
+        если очередь полна или бюджет кончился в ожидании — AdmissionRejected.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    self.stats["rejected"] += 1
+                    raise AdmissionRejected("очередь к моделям переполнена")
+                self._waiting += 1
+
+            try:
+                if deadline is None:
+                    acquired = self._slots.acquire()
+                else:
+                    timeout = deadline.remaining_ms() / 1000
+                    acquired = timeout > 0 and self._slots.acquire(timeout=timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+            if not acquired:
+                with self._lock:
+                    self.stats["rejected"] += 1
+                raise AdmissionRejected("бюджет запроса истёк в очереди к моделям")
+
+        with self._lock:
+            self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+admission = AdmissionController()
@@ -0,0 +1,135 @@
+"""
+Построение партиций вакансий по профессии (см. app.partitions).
+
+1. Самые частые профессии (occupation из normalized) получают свои партиции
+   1..PARTITION_COUNT-1, остальные вакансии — партиция 0 («прочее»).
+2. Для каждой партиции считается центроид — по нему роутятся запросы.
+3. Для каждой партиции создаётся свой частичный HNSW-индекс.
+
+Новые вакансии получают партицию в embed_vacancies. Перестраивать разбиение
+нужно, когда меняется состав профессий.
+
+Запуск: python -m app.build_partitions
+Переиндексация одной партиции: python -m app.build_partitions --reindex 3
+"""
+import sys
+from collections import Counter
+
+import numpy as np
+import psycopg2.extras
+
+from app.db import get_conn
+from app.partitions import PARTITION_COUNT, OTHER_PARTITION, normalize_occupation, partition_index_name
+
+
+def create_partition_index(cur, partition_id: int) -> None:
+    # предикат совпадает с условием в запросах поиска (app.search) —
+    # иначе планировщик не возьмёт частичный индекс
+    cur.execute(f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index_name(partition_id)}
+        ON messages USING hnsw (embedding vector_cosine_ops)
+        WHERE partition_id = {int(partition_id)} AND is_valid
+    """)
+
+
+conn = get_conn()
+# CREATE / REINDEX INDEX CONCURRENTLY нельзя выполнять в транзакции
+conn.autocommit = True
+cur = conn.cursor()
+
+if "--reindex" in sys.argv:
+    partition_id = int(sys.argv[sys.argv.index("--reindex") + 1])
+    cur.execute(f"REINDEX INDEX CONCURRENTLY {partition_index_name(partition_id)}")
+    cur.close()
+    conn.close()
+    print(f"Партиция {partition_id} переиндексирована.")
+    sys.exit(0)
+
+# ---------- 1. РАЗБИЕНИЕ ПО ПРОФЕССИЯМ ----------
+# профессию разбираем той же normalize_occupation, что и partition_for в embed_vacancies
+# (normalized бывает и списком) — иначе одна вакансия попадала бы в разные партиции
+conn.autocommit = False
+read_cur = conn.cursor(name="build_partitions_vacancies")
+read_cur.itersize = 10000
+read_cur.execute("""
+    SELECT id, partition_id, normalized
+    FROM messages
+    WHERE embedding IS NOT NULL
+""")
+vacancies = [
+    (row_id, partition_id, normalize_occupation(normalized))
+    for row_id, partition_id, normalized in read_cur
+]
+read_cur.close()
+
+counts = Counter(occupation for _, _, occupation in vacancies if occupation)
+occupations = [occupation for occupation, _ in counts.most_common(PARTITION_COUNT - 1)]
+partitions = {occupation: i + 1 for i, occupation in enumerate(occupations)}
+
+assignments = [
+    (row_id, partitions.get(occupation, OTHER_PARTITION))
+    for row_id, current, occupation in vacancies
+    if partitions.get(occupation, OTHER_PARTITION) != current
+]
+psycopg2.extras.execute_values(
+    cur,
+    """
+    UPDATE messages AS m
+    SET partition_id = v.partition_id
+    FROM (VALUES %s) AS v (id, partition_id)
+    WHERE m.id = v.id
+    """,
+    assignments,
+    template="(%s, %s::smallint)",
+    page_size=1000
+)
+print(f"Reassigned vacancies: {len(assignments)}")
+
+# ---------- 2. ЦЕНТРОИДЫ ----------
+cur.execute("""
+    SELECT partition_id, avg(embedding), count(*)
+    FROM messages
+    WHERE embedding IS NOT NULL AND partition_id IS NOT NULL
+    GROUP BY partition_id
+""")
+centroids = cur.fetchall()
+
+cur.execute("DELETE FROM vacancy_partitions")
+occupation_by_id = {partition_id: occupation for occupation, partition_id in partitions.items()}
+for partition_id, centroid, size in centroids:
+    centroid = np.asarray(centroid, dtype=np.float32)
+    centroid = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+    cur.execute(
+        """
+        INSERT INTO vacancy_partitions (id, occupation, centroid, size)
+        VALUES (%s, %s, %s, %s)
+        """,
+        (partition_id, occupation_by_id.get(partition_id, ""), centroid, size)
+    )
+conn.commit()
+
+# ---------- 3. ИНДЕКСЫ ПО ПАРТИЦИЯМ ----------
+conn.autocommit = True
+partition_ids = [OTHER_PARTITION] + list(partitions.values())
+for partition_id in partition_ids:
+    create_partition_index(cur, partition_id)
+    print(f"Index ready for partition {partition_id}")
+
+# индексы партиций, которых больше нет
+cur.execute("""
+    SELECT indexname
+    FROM pg_indexes
+    WHERE tablename = 'messages' AND indexname LIKE 'messages\_embedding\_p%\_hnsw\_idx'
+""")
+current_indexes = {partition_index_name(partition_id) for partition_id in partition_ids}
+for (index_name,) in cur.fetchall():
+    if index_name not in current_indexes:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+        print(f"Dropped stale index {index_name}")
+
+cur.close()
+conn.close()
+
+print(f"Готово. Партиций: {len(centroids)}")
+for partition_id, _, size in sorted(centroids):
+    print(f"  {partition_id}: {occupation_by_id.get(partition_id, 'прочее')} — {size}")
@@ -0,0 +1,45 @@
+"""
+Разметка почти-дубликатов для уже проиндексированных вакансий (simhash / cluster_id).
+
+Новые вакансии размечаются в embed_vacancies, этот скрипт нужен для бэкфилла.
+Вакансии обходятся по возрастанию id — представителем кластера становится самая ранняя копия.
+
+Запуск: python -m app.cluster_vacancies
+С пересчётом всех: python -m app.cluster_vacancies --force
+"""
+import sys
+from app.db import get_conn
+from app.dedup import assign_cluster
+from app.text_normalizer import normalize_vacancy
+import psycopg2.extras
+
+conn = get_conn()
+cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+force_recluster = "--force" in sys.argv
+if force_recluster:
+    cur.execute("UPDATE messages SET simhash = NULL, cluster_id = NULL")
+    conn.commit()
+
+cur.execute("""
+    SELECT id, content, embedding
+    FROM messages
+    WHERE embedding IS NOT NULL AND simhash IS NULL
+    ORDER BY id
+""")
+
+rows = cur.fetchall()
+
+for row in rows:
+    cluster_id = assign_cluster(
+        conn,
+        row["id"],
+        normalize_vacancy(row["content"] or ""),
+        row["embedding"]
+    )
+    conn.commit()
+    print(f"Processed {row['id']} -> cluster {cluster_id}")
+
+cur.close()
+conn.close()
+print(f"Готово. Размечено вакансий: {len(rows)}")
@@ -1,7 +1,3 @@
-from typing import List
-import math
-
-
 def information_density(text: str) -> float:
     words = text.lower().split()
     if len(words) < 20:
@@ -20,31 +16,14 @@ def length_score(text: str) -> float:
     return 1.0
 
 
-def cosine_similarity(a, b):
-    a = [float(x) for x in a]
-    b = [float(x) for x in b]
-    return sum(x * y for x, y in zip(a, b))
-
-
-
-def embedding_confidence(
-    vacancy_embedding: List[float],
-    generic_embedding: List[float]
-) -> float:
-    sim = cosine_similarity(vacancy_embedding, generic_embedding)
-    return max(0.0, 1.0 - sim)
-
-
-def compute_confidence(
-    text: str,
-    vacancy_embedding,
-    generic_embedding
-) -> float:
-    vacancy_embedding = [float(x) for x in vacancy_embedding]
-    generic_embedding = [float(x) for x in generic_embedding]
-
+def text_confidence(text: str) -> float:
+    """
+    Текстовая часть confidence. Не зависит от запроса — сохраняется
+    в messages.text_confidence при индексации, embedding-часть поиск
+    считает в SQL (app.search.CONFIDENCE_SQL).
+    """
     return (
         0.4 * information_density(text) +
-        0.3 * length_score(text) +
-        0.3 * embedding_confidence(vacancy_embedding, generic_embedding)
+        0.3 * length_score(text)
     )
+
@@ -0,0 +1,100 @@
+"""
+Поиск почти-дубликатов вакансий (репосты одной вакансии с мелкими правками).
+
+SimHash по очищенному тексту — 64-битный отпечаток, у почти одинаковых
+текстов он отличается в нескольких битах. Кандидатов в дубликаты берём из
+ближайших соседей по embedding (pgvector), SimHash подтверждает, что это
+тот же текст. Все копии получают общий cluster_id в messages — id самой
+ранней проиндексированной копии.
+"""
+import hashlib
+import os
+import re
+from typing import List
+
+# Максимальное расстояние Хэмминга между SimHash, при котором тексты считаются дубликатами.
+# Правка одного слова в тексте на 60–300 слов сдвигает SimHash по 3-граммам на 3–6 бит
+# (в хвосте — до ~13), у несвязанных текстов расстояние ~32 (редко меньше 17).
+# Кандидаты и так ограничены DEDUP_MAX_DISTANCE по embedding, поэтому порог с запасом.
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", 10))
+# Сколько ближайших соседей по embedding проверяем
+DEDUP_NEIGHBOURS = int(os.getenv("DEDUP_NEIGHBOURS", 10))
+# Соседи дальше этого cosine distance дубликатами не считаются
+DEDUP_MAX_DISTANCE = float(os.getenv("DEDUP_MAX_DISTANCE", 0.05))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_MASK_64 = (1 << 64) - 1
+
+
+def _shingles(text: str, size: int = 3) -> List[str]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """
+    64-битный SimHash по словным 3-граммам.
+    Возвращается как знаковое число — BIGINT в Postgres знаковый.
+    """
+    weights = [0] * 64
+    for shingle in _shingles(text):
+        h = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(),
+            "big"
+        )
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK_64).count("1")
+
+
+def assign_cluster(conn, vacancy_id: int, text: str, embedding) -> int:
+    """
+    Считает SimHash вакансии, ищет среди соседей по embedding почти-дубликат
+    и записывает simhash / cluster_id в messages. Коммит — на вызывающей стороне.
+
+    Соседи ищутся только среди валидных вакансий (is_valid) — так запрос идёт
+    по частичному HNSW-индексу (см. migrate_vacancy_scoring), а не полным сканом.
+    """
+    fingerprint = simhash(text)
+
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, cluster_id, simhash, embedding <=> %s::vector AS distance
+        FROM messages
+        WHERE id <> %s
+          AND simhash IS NOT NULL
+          AND embedding IS NOT NULL
+          AND is_valid
+        ORDER BY distance
+        LIMIT %s
+        """,
+        (embedding, vacancy_id, DEDUP_NEIGHBOURS)
+    )
+
+    cluster_id = vacancy_id
+    for neighbour_id, neighbour_cluster, neighbour_hash, distance in cur.fetchall():
+        if distance > DEDUP_MAX_DISTANCE:
+            break
+        if hamming_distance(fingerprint, neighbour_hash) <= SIMHASH_MAX_DISTANCE:
+            cluster_id = neighbour_cluster or neighbour_id
+            break
+
+    cur.execute(
+        "UPDATE messages SET simhash = %s, cluster_id = %s WHERE id = %s",
+        (fingerprint, cluster_id, vacancy_id)
+    )
+    cur.close()
+    return cluster_id
@@ -34,7 +34,7 @@ for row in rows:
     emb = embedding_model.encode(
         f"passage: {text}",
         normalize_embeddings=True
-    ).tolist()
+    )
 
     cur.execute(
         "UPDATE users SET embedding = %s WHERE id = %s",
@@ -3,12 +3,23 @@
 
 E5-модель требует префиксы: "query: " для запросов, "passage: " для документов.
 После изменения префиксов нужно пересчитать embeddings: python -m app.embed_vacancies --force
+
+Заодно вакансия размечается на почти-дубликаты (simhash / cluster_id, см. app.dedup)
+и получает партицию по профессии (partition_id, см. app.partitions).
+
+С NORMALIZATION_QUEUE=1 LLM-нормализация идёт через воркеры
+app.normalization_worker с приоритетом бэкфилла: все тексты ставятся
+в очередь сразу, интерактивные запросы API обгоняют их.
 """
 import sys
 from app.models import embedding_model
 from app.db import get_conn
+from app.dedup import assign_cluster
+from app.confidence import text_confidence
+from app.partitions import router as partition_router
 from app.text_normalizer import normalize_vacancy
-from app.vacancy_normalizer import normalize_vacancy_llm, normalized_data_to_embedding_text
+from app.vacancy_normalizer import normalized_data_to_embedding_text
+from app.normalization_queue import NORMALIZATION_QUEUE, PRIORITY_BACKFILL, normalize, submit_many
 import psycopg2.extras
 
 conn = get_conn()
@@ -21,12 +32,19 @@ cur.execute(f"""
     SELECT id, content, normalized
     FROM messages
     {where_clause}
+    ORDER BY id
 """)
 
 rows = cur.fetchall()
 
+if NORMALIZATION_QUEUE:
+    submit_many(
+        [row["content"] for row in rows if not row.get("normalized")],
+        priority=PRIORITY_BACKFILL
+    )
+
 for row in rows:
-    normalized_data = row.get("normalized") or normalize_vacancy_llm(row["content"])
+    normalized_data = row.get("normalized") or normalize(row["content"], priority=PRIORITY_BACKFILL)
     text = normalized_data_to_embedding_text(normalized_data) or normalize_vacancy(row["content"])
     if isinstance(normalized_data, dict) and "error" not in normalized_data and not row.get("normalized"):
         cur.execute(
@@ -37,11 +55,20 @@ for row in rows:
     emb = embedding_model.encode(
         f"passage: {text}",
         normalize_embeddings=True
-    ).tolist()
+    )
+
+    cur.execute(
+        "UPDATE messages SET embedding = %s, text_confidence = %s WHERE id = %s",
+        (emb, text_confidence(row["content"] or ""), row["id"])
+    )
+
+    # Схлопывание почти-дубликатов: общий cluster_id для репостов одной вакансии
+    assign_cluster(conn, row["id"], normalize_vacancy(row["content"]), emb)
 
+    # Партиция по профессии (см. app.build_partitions); до построения партиций — «прочее»
     cur.execute(
-        "UPDATE messages SET embedding = %s WHERE id = %s",
-        (emb, row["id"])
+        "UPDATE messages SET partition_id = %s WHERE id = %s",
+        (partition_router.partition_for(normalized_data), row["id"])
     )
 
     conn.commit()
@@ -0,0 +1,52 @@
+"""
+Отдача предрасчитанных результатов для частых запросов (таблица head_query_results).
+
+Результат берётся одним чтением по первичному ключу, и только если он посчитан
+на текущей версии корпуса — после любых изменений messages запрос идёт
+обычным путём, пока app.precompute_head_queries не пересчитает таблицу.
+"""
+from typing import Any, Dict, List, Optional
+
+import psycopg2.extras
+
+from app.db import get_conn
+from app.search_cache import normalize_query
+
+
+def get_head_query_results(query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Предрасчитанные результаты search_vacancies для запроса.
+    None — запроса нет среди частых, результат устарел или таблица недоступна.
+    """
+    try:
+        conn = get_conn()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            """
+            SELECT r.vacancy_id AS id, m.content, r.score
+            FROM head_query_results h
+            JOIN corpus_version v
+              ON v.name = 'messages' AND v.version = h.corpus_version
+            CROSS JOIN LATERAL unnest(h.vacancy_ids, h.scores)
+                WITH ORDINALITY AS r(vacancy_id, score, position)
+            JOIN messages m ON m.id = r.vacancy_id
+            WHERE h.query_norm = %s
+            ORDER BY r.position
+            LIMIT %s
+            """,
+            (normalize_query(query), limit)
+        )
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print("head_queries: lookup unavailable:", e)
+        return None
+
+    # пустые результаты precompute_head_queries не сохраняет
+    if not rows:
+        return None
+    return [
+        {"id": r["id"], "content": r["content"], "score": float(r["score"])}
+        for r in rows
+    ]
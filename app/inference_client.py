@@ -0,0 +1,116 @@
+"""
+Клиент общего inference-сервера (app.inference_server).
+
+Прокси повторяют интерфейс SentenceTransformer.encode / CrossEncoder.predict,
+поэтому search.py и остальной код не знают, где живут модели.
+У каждого потока своё соединение; соединения распределяются по серверам round-robin.
+"""
+import itertools
+import threading
+import time
+from multiprocessing.connection import Client
+
+from app.settings import (
+    INFERENCE_SOCKETS,
+    INFERENCE_AUTHKEY,
+    INFERENCE_CONNECT_TIMEOUT,
+    INFERENCE_CALL_TIMEOUT,
+)
+
+
+class InferenceClient:
+    def __init__(
+        self,
+        addresses=INFERENCE_SOCKETS,
+        authkey=INFERENCE_AUTHKEY,
+        connect_timeout=INFERENCE_CONNECT_TIMEOUT,
+        call_timeout=INFERENCE_CALL_TIMEOUT
+    ):
+        if not addresses:
+            raise ValueError("Не задан INFERENCE_SOCKET")
+        if not authkey:
+            raise ValueError("Не задан INFERENCE_AUTHKEY")
+        self._addresses = list(addresses)
+        self._authkey = authkey
+        self._connect_timeout = connect_timeout
+        self._call_timeout = call_timeout
+        self._round_robin = itertools.cycle(range(len(self._addresses)))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        with self._lock:
+            address = self._addresses[next(self._round_robin)]
+
+        deadline = time.monotonic() + self._connect_timeout
+        while True:
+            try:
+                return Client(address, family="AF_UNIX", authkey=self._authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # сервер ещё загружает модели
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _roundtrip(self, conn, op, args, kwargs):
+        """Ответ сервера или None, если он не пришёл за call_timeout."""
+        conn.send((op, args, kwargs))
+        if not conn.poll(self._call_timeout):
+            return None
+        return conn.recv()
+
+    def call(self, op: str, *args, **kwargs):
+        try:
+            response = self._roundtrip(self._connection(), op, args, kwargs)
+        except (EOFError, OSError):
+            # сервер перезапустился — один раз переподключаемся
+            self._drop_connection()
+            response = self._roundtrip(self._connection(), op, args, kwargs)
+
+        if response is None:
+            # запоздавший ответ перепутается со следующим вызовом — соединение не переиспользуем
+            self._drop_connection()
+            raise TimeoutError(f"inference server did not answer {op} in {self._call_timeout:.0f} s")
+
+        status, payload = response
+        if status == "error":
+            raise RuntimeError(f"inference server error in {op}: {payload}")
+        return payload
+
+
+client = InferenceClient()
+
+
+class RemoteEmbeddingModel:
+    """Замена SentenceTransformer: encode выполняется в inference-сервере."""
+
+    def encode(self, sentences, **kwargs):
+        return client.call("encode", sentences, **kwargs)
+
+
+class RemoteRerankerModel:
+    """Замена CrossEncoder: predict выполняется в inference-сервере."""
+
+    def predict(self, sentences, **kwargs):
+        return client.call("predict", sentences, **kwargs)
+
+
+def generate(prompt: str) -> str:
+    """Генерация LLM-нормализатора в inference-сервере."""
+    return client.call("generate", prompt)
@@ -0,0 +1,102 @@
+"""
+Общий inference-сервер: держит embedding-модель, reranker и LLM-нормализатор
+в одном процессе и обслуживает API-воркеры по Unix-сокету.
+
+Несколько uvicorn-воркеров больше не держат каждый свою копию моделей —
+количество воркеров ограничено CPU, а не памятью.
+
+Запуск сервера: INFERENCE_AUTHKEY=... python -m app.inference_server --socket /run/mlk/inference.sock
+API-воркеры:   INFERENCE_AUTHKEY=... INFERENCE_SOCKET=/run/mlk/inference.sock uvicorn app.main:app --workers 4
+Несколько серверов — несколько сокетов через запятую в INFERENCE_SOCKET.
+
+Сообщения — pickle, поэтому ключ INFERENCE_AUTHKEY обязателен, а сокет
+доступен только пользователю сервера (0600, каталог создаётся с 0700).
+"""
+import os
+import sys
+import threading
+
+# до импорта app.*: сам сервер всегда загружает модели локально
+os.environ["INFERENCE_SERVER"] = "1"
+
+from multiprocessing.connection import Listener
+
+from app.settings import INFERENCE_AUTHKEY, INFERENCE_SOCKETS
+from app.models import embedding_model, reranker_model
+from app.vacancy_normalizer import generate, load_generator
+
+
+OPS = {
+    "encode": embedding_model.encode,
+    "predict": reranker_model.predict,
+    "generate": generate,
+}
+
+# Вызовы одной модели сериализуем, разные модели могут работать параллельно
+LOCKS = {op: threading.Lock() for op in OPS}
+
+
+def handle_connection(conn):
+    try:
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except EOFError:
+                break
+
+            try:
+                with LOCKS[op]:
+                    result = OPS[op](*args, **kwargs)
+                conn.send(("ok", result))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+    finally:
+        conn.close()
+
+
+def main():
+    if not INFERENCE_AUTHKEY:
+        # сервер распаковывает pickle от любого клиента, знающего ключ
+        sys.exit("Задайте INFERENCE_AUTHKEY — без ключа inference-сервер не запускается")
+
+    if "--socket" in sys.argv:
+        address = sys.argv[sys.argv.index("--socket") + 1]
+    elif INFERENCE_SOCKETS:
+        address = INFERENCE_SOCKETS[0]
+    else:
+        address = "/tmp/mlk-inference.sock"
+
+    socket_dir = os.path.dirname(os.path.abspath(address))
+    if not os.path.isdir(socket_dir):
+        os.makedirs(socket_dir, mode=0o700)
+
+    if os.path.exists(address):
+        os.unlink(address)
+
+    print("Loading LLM normalizer...")
+    load_generator()
+
+    # сокет доступен только владельцу процесса: umask на время bind, chmod — на всякий случай
+    old_umask = os.umask(0o077)
+    try:
+        listener = Listener(address, family="AF_UNIX", authkey=INFERENCE_AUTHKEY)
+    finally:
+        os.umask(old_umask)
+    os.chmod(address, 0o600)
+    print(f"Inference server listening on {address}")
+
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # неверный authkey и т.п. — не роняем сервер
+                print("Inference server accept failed:", e)
+                continue
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,37 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from collections import Counter
+import hashlib
 import math
-from app.search import search_vacancies, search_vacancies_without_rerank, search_users_by_vacancy
+import os
+import psycopg2.extras
+from app.search import (
+    TOP_K,
+    search_vacancies,
+    search_vacancies_without_rerank,
+    search_users_by_vacancy,
+    search_users_by_stored_vacancy,
+    get_precomputed_user_matches,
+)
 from app.db import get_conn
+from app.query_log import query_log
+from app.budget import admission, deadline_for, AdmissionRejected
+from app.search_cache import search_cache
+from app.head_queries import get_head_query_results
 from app.models import embedding_model, reranker_model
 from app.schemas import (
     EmbedRequest,
     VacancyMatchRequest,
     AddUserRequest,
+    BulkAddUsersRequest,
 )
 
 app = FastAPI(title="Job Semantic Search ML Service")
 
+# Ограничения для /users/bulk
+USERS_BULK_MAX = int(os.getenv("USERS_BULK_MAX", 5000))
+USERS_BULK_BATCH_SIZE = int(os.getenv("USERS_BULK_BATCH_SIZE", 256))
+
 
 class SearchRequest(BaseModel):
     text: str
@@ -36,21 +56,76 @@ def normalize_scores_to_percent(scores):
     ]
 
 
+def overloaded(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+def cached_search(name: str, text: str, deadline, run, precomputed=None, **params):
+    """
+    Поиск через кэш результатов (app.search_cache). При промахе сначала пробуем
+    precomputed() (результаты частых запросов, app.head_queries), затем run()
+    под admission control; деградированные по бюджету результаты не кэшируются.
+    Возвращает (results, статус кэша), путь деградации выставляется в deadline.
+    Статус "precomputed" — результат взят из предрасчёта, а не посчитан.
+    """
+    def compute():
+        if precomputed is not None:
+            results = precomputed()
+            if results is not None:
+                return (results, deadline.degradation, True), True
+        with admission.slot(deadline):
+            results = run()
+        return (results, deadline.degradation, False), deadline.degradation == "full"
+
+    (results, degradation, from_precomputed), cache_status = search_cache.get_or_compute(
+        name,
+        text,
+        compute,
+        timeout=max(0.0, deadline.remaining_ms()) / 1000,
+        **params
+    )
+    if from_precomputed and cache_status in ("miss", "bypass"):
+        cache_status = "precomputed"
+    deadline.degrade(degradation)
+    return results, cache_status
+
+
+def description_hash(description: str) -> str:
+    """Хэш описания профиля — по нему /users/bulk пропускает неизменённые профили."""
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+@app.on_event("startup")
+def start_query_log():
+    query_log.start()
+
+
+@app.on_event("shutdown")
+def stop_query_log():
+    # сбрасываем остаток буфера запросов в БД
+    query_log.stop()
+
+
+@app.get("/metrics/search_cache")
+def search_cache_metrics():
+    return search_cache.snapshot()
+
+
 @app.post("/query")
 def process_query(content: str):
-    # сохраняем запрос
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO main (content) VALUES (%s)",
-        (content,)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    # сохраняем запрос (write-behind: запись в БД идёт в фоне пачками)
+    query_log.log(content)
 
     # ищем вакансии
-    results = search_vacancies(content)
+    deadline = deadline_for("query")
+    try:
+        results, _ = cached_search(
+            "search_vacancies", content, deadline,
+            lambda: search_vacancies(content, deadline=deadline),
+            precomputed=lambda: get_head_query_results(content, limit=TOP_K)
+        )
+    except AdmissionRejected as e:
+        raise overloaded(e)
     return results
 
 @app.post("/embed")
@@ -68,7 +143,16 @@ def embed(req: EmbedRequest):
 def search(req: SearchRequest):
     top_n = max(1, min(req.top_n, 20))  # защита: 1..20
 
-    results = search_vacancies(req.text)
+    deadline = deadline_for("search")
+    try:
+        results, cache_status = cached_search(
+            "search_vacancies", req.text, deadline,
+            lambda: search_vacancies(req.text, deadline=deadline, limit=top_n),
+            precomputed=lambda: get_head_query_results(req.text, limit=top_n),
+            limit=top_n
+        )
+    except AdmissionRejected as e:
+        raise overloaded(e)
 
     top_results = results[:top_n]
 
@@ -86,7 +170,8 @@ def search(req: SearchRequest):
 
     return {
         "query": req.text,
-        "results": response
+        "results": response,
+        "meta": {**deadline.meta(), "cache": cache_status}
     }
 
 
@@ -100,10 +185,11 @@ def add_user(req: AddUserRequest):
     if not req.description or len(req.description.strip()) < 10:
         raise HTTPException(status_code=400, detail="content слишком короткий (минимум 10 символов)")
 
+    description = req.description.strip()
     embedding = embedding_model.encode(
-        f"passage: {req.description.strip()}",
+        f"passage: {description}",
         normalize_embeddings=True
-    ).tolist()
+    )
 
     conn = get_conn()
     cur = conn.cursor()
@@ -114,8 +200,8 @@ def add_user(req: AddUserRequest):
     row = cur.fetchone()
     if row:
         cur.execute(
-            "UPDATE main SET description = %s, embedding = %s WHERE user_id = %s::bigint",
-            (req.description.strip(), embedding, req.user_id)
+            "UPDATE main SET description = %s, description_hash = %s, embedding = %s WHERE user_id = %s::bigint",
+            (description, description_hash(description), embedding, req.user_id)
         )
         conn.commit()
         cur.close()
@@ -123,8 +209,8 @@ def add_user(req: AddUserRequest):
         return {"id": row[0], "status": "updated"}
     else:
         cur.execute(
-            "INSERT INTO main (user_id, description, embedding) VALUES (%s::bigint, %s, %s) RETURNING id",
-            (req.user_id, req.description.strip(), embedding)
+            "INSERT INTO main (user_id, description, description_hash, embedding) VALUES (%s::bigint, %s, %s, %s) RETURNING id",
+            (req.user_id, description, description_hash(description), embedding)
         )
         user_id = cur.fetchone()[0]
         conn.commit()
@@ -133,13 +219,132 @@ def add_user(req: AddUserRequest):
         return {"id": user_id, "status": "created"}
 
 
+@app.post("/users/bulk")
+def add_users_bulk(req: BulkAddUsersRequest):
+    """
+    Пакетно добавляет/обновляет пользователей (ночная синхронизация профилей).
+    Профили с неизменённым описанием (по description_hash) пропускаются,
+    остальные кодируются батчами и пишутся одним
+    INSERT ... ON CONFLICT (user_id) DO UPDATE на батч.
+    Возвращает статус по каждому элементу в порядке запроса.
+    """
+    if len(req.users) > USERS_BULK_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"слишком много профилей в запросе (максимум {USERS_BULK_MAX})"
+        )
+
+    statuses = [None] * len(req.users)
+
+    # ---------- 1. ВАЛИДАЦИЯ И ДЕДУПЛИКАЦИЯ user_id ----------
+    # Один user_id дважды в одном INSERT ... ON CONFLICT недопустим — берём последнее вхождение
+    latest = {}
+    for i, user in enumerate(req.users):
+        if not user.description or len(user.description.strip()) < 10:
+            statuses[i] = {
+                "user_id": user.user_id,
+                "status": "error",
+                "detail": "content слишком короткий (минимум 10 символов)"
+            }
+            continue
+        if user.user_id in latest:
+            statuses[latest[user.user_id]] = {"user_id": user.user_id, "status": "duplicate"}
+        latest[user.user_id] = i
+
+    conn = get_conn()
+    cur = conn.cursor()
+
+    # ---------- 2. ПРОПУСКАЕМ НЕИЗМЕНЁННЫЕ ПРОФИЛИ ----------
+    existing = {}
+    if latest:
+        cur.execute(
+            "SELECT user_id, id, description_hash FROM main WHERE user_id = ANY(%s::bigint[])",
+            (list(latest),)
+        )
+        existing = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+    pending = []
+    for user_id, i in latest.items():
+        description = req.users[i].description.strip()
+        desc_hash = description_hash(description)
+        row = existing.get(user_id)
+        if row and row[1] == desc_hash:
+            statuses[i] = {"user_id": user_id, "id": row[0], "status": "unchanged"}
+        else:
+            pending.append((i, user_id, description, desc_hash))
+
+    # ---------- 3. BATCH ENCODE + UPSERT ----------
+    for start in range(0, len(pending), USERS_BULK_BATCH_SIZE):
+        batch = pending[start:start + USERS_BULK_BATCH_SIZE]
+
+        embeddings = embedding_model.encode(
+            [f"passage: {description}" for _, _, description, _ in batch],
+            batch_size=32,
+            normalize_embeddings=True
+        )
+
+        rows = psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO main (user_id, description, description_hash, embedding)
+            VALUES %s
+            ON CONFLICT (user_id) DO UPDATE
+            SET description = EXCLUDED.description,
+                description_hash = EXCLUDED.description_hash,
+                embedding = EXCLUDED.embedding
+            RETURNING user_id, id, (xmax = 0) AS inserted
+            """,
+            [
+                (user_id, description, desc_hash, embedding)
+                for (_, user_id, description, desc_hash), embedding in zip(batch, embeddings)
+            ],
+            template="(%s::bigint, %s, %s, %s)",
+            page_size=len(batch),
+            fetch=True
+        )
+        conn.commit()
+
+        written = {r[0]: (r[1], r[2]) for r in rows}
+        for i, user_id, _, _ in batch:
+            row_id, inserted = written[user_id]
+            statuses[i] = {
+                "user_id": user_id,
+                "id": row_id,
+                "status": "created" if inserted else "updated"
+            }
+
+    cur.close()
+    conn.close()
+
+    return {
+        "results": statuses,
+        "counts": dict(Counter(s["status"] for s in statuses))
+    }
+
+
 @app.post("/vacancy/match_users")
 def match_users_by_vacancy(req: VacancyMatchRequest):
     """
-    Принимает текст вакансии и возвращает подходящих пользователей (кандидатов).
+    Принимает вакансию (id из messages и/или текст) и возвращает подходящих
+    пользователей (кандидатов). Для вакансий с предрасчётом совпадений
+    (app.precompute_matches) ответ берётся из vacancy_user_matches, для остальных
+    сохранённых вакансий — по их normalized и embedding без LLM-нормализации.
     """
+    if req.vacancy_id is None and not req.vacancy_text:
+        raise HTTPException(status_code=400, detail="нужен vacancy_id или vacancy_text")
+
     top_n = max(1, min(req.top_n, 50))
-    results = search_users_by_vacancy(req.vacancy_text, top_k=top_n)
+
+    results = None
+    if req.vacancy_id is not None:
+        results = get_precomputed_user_matches(req.vacancy_id, top_k=top_n)
+        if results is None:
+            # нет предрасчёта — берём сохранённые normalized и embedding (без LLM и encode)
+            results = search_users_by_stored_vacancy(req.vacancy_id, top_k=top_n)
+    if results is None:
+        if not req.vacancy_text:
+            raise HTTPException(status_code=404, detail="вакансия не найдена")
+        results = search_users_by_vacancy(req.vacancy_text, top_k=top_n)
 
     scores = [r["score"] for r in results]
     percents = normalize_scores_to_percent(scores) if scores else []
@@ -152,8 +357,10 @@ def match_users_by_vacancy(req: VacancyMatchRequest):
             "relevance_percent": p
         })
 
+    vacancy_text = req.vacancy_text or ""
     return {
-        "vacancy_text": req.vacancy_text[:200] + ("..." if len(req.vacancy_text) > 200 else ""),
+        "vacancy_id": req.vacancy_id,
+        "vacancy_text": vacancy_text[:200] + ("..." if len(vacancy_text) > 200 else ""),
         "results": response
     }
 
@@ -162,7 +369,16 @@ def match_users_by_vacancy(req: VacancyMatchRequest):
 def search_without_rerank(req: SearchRequest):
     top_n = max(1, min(req.top_n, 20))  # защита: 1..20 
 
-    results = search_vacancies_without_rerank(req.text)
+    deadline = deadline_for("search_without_rerank")
+    try:
+        # content подтягивается только для top_n результатов (двухфазный поиск)
+        results, cache_status = cached_search(
+            "search_vacancies_without_rerank", req.text, deadline,
+            lambda: search_vacancies_without_rerank(req.text, limit=top_n, deadline=deadline),
+            limit=top_n
+        )
+    except AdmissionRejected as e:
+        raise overloaded(e)
 
     top_results = results[:top_n]
 
@@ -180,5 +396,6 @@ def search_without_rerank(req: SearchRequest):
 
     return {
         "query": req.text,
-        "results": response
+        "results": response,
+        "meta": {**deadline.meta(), "cache": cache_status}
     }    
\ No newline at end of file
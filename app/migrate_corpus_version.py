@@ -0,0 +1,68 @@
+"""
+Миграция: счётчик версии корпуса вакансий для инвалидации кэша поиска.
+
+Триггер на messages увеличивает corpus_version.version при любой вставке,
+удалении или изменении content / normalized / embedding, а также cluster_id
+и partition_id, если эти колонки уже созданы (migrate_vacancy_clusters,
+migrate_vacancy_partitions; после них миграцию можно перезапустить) —
+кто бы ни писал в таблицу (embed_vacancies, build_partitions, внешние загрузчики и т.п.).
+
+Запуск: python -m app.migrate_corpus_version
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    CREATE TABLE IF NOT EXISTS corpus_version (
+        name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+""")
+
+cur.execute("""
+    INSERT INTO corpus_version (name, version)
+    VALUES ('messages', 0)
+    ON CONFLICT (name) DO NOTHING
+""")
+
+cur.execute("""
+    CREATE OR REPLACE FUNCTION bump_corpus_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE corpus_version SET version = version + 1 WHERE name = TG_TABLE_NAME;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+""")
+
+# колонки, влияющие на результаты поиска; cluster_id и partition_id появляются
+# в своих миграциях (migrate_vacancy_clusters / migrate_vacancy_partitions) —
+# следим только за уже созданными, иначе CREATE TRIGGER ... UPDATE OF упадёт
+OPTIONAL_COLUMNS = ["cluster_id", "partition_id"]
+cur.execute("""
+    SELECT column_name FROM information_schema.columns
+    WHERE table_name = 'messages' AND column_name = ANY(%s)
+""", (OPTIONAL_COLUMNS,))
+existing = {row[0] for row in cur.fetchall()}
+watched_columns = ["content", "normalized", "embedding"] + [c for c in OPTIONAL_COLUMNS if c in existing]
+
+cur.execute("DROP TRIGGER IF EXISTS messages_bump_corpus_version ON messages")
+cur.execute(f"""
+    CREATE TRIGGER messages_bump_corpus_version
+    AFTER INSERT OR DELETE OR UPDATE OF {", ".join(watched_columns)} ON messages
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_version()
+""")
+
+cur.execute("DROP TRIGGER IF EXISTS messages_bump_corpus_version_truncate ON messages")
+cur.execute("""
+    CREATE TRIGGER messages_bump_corpus_version_truncate
+    AFTER TRUNCATE ON messages
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_version()
+""")
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: corpus_version и триггеры на messages созданы.")
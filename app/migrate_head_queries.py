@@ -0,0 +1,32 @@
+"""
+Миграция: таблица предрасчитанных результатов частых запросов.
+
+head_query_results — для каждого частого нормализованного запроса из лога
+(см. app.precompute_head_queries) ранжированные id вакансий и их score, а также
+версия корпуса, на которой они посчитаны. API отдаёт строку, только если
+версия совпадает с текущей (corpus_version, см. migrate_corpus_version).
+
+Запуск: python -m app.migrate_head_queries
+После миграции: python -m app.precompute_head_queries
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    CREATE TABLE IF NOT EXISTS head_query_results (
+        query_norm TEXT PRIMARY KEY,
+        vacancy_ids BIGINT[] NOT NULL,
+        scores REAL[] NOT NULL,
+        hits BIGINT NOT NULL DEFAULT 0,
+        corpus_version BIGINT NOT NULL,
+        computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+""")
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: таблица head_query_results создана.")
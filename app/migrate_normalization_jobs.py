@@ -0,0 +1,50 @@
+"""
+Миграция: очередь и хранилище результатов LLM-нормализации (normalization_jobs).
+
+Одна строка на уникальный текст вакансии (text_hash): статус задачи
+(pending → running → done | failed), приоритет, аренда воркера и результат.
+См. app.normalization_queue и app.normalization_worker.
+
+Запуск: python -m app.migrate_normalization_jobs
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    CREATE TABLE IF NOT EXISTS normalization_jobs (
+        id BIGSERIAL PRIMARY KEY,
+        text_hash TEXT NOT NULL UNIQUE,
+        vacancy_text TEXT NOT NULL,
+        priority SMALLINT NOT NULL DEFAULT 10,
+        status TEXT NOT NULL DEFAULT 'pending',
+        result JSONB,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        started_at TIMESTAMPTZ,
+        lease_until TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ
+    )
+""")
+
+# Выборка следующей задачи воркером
+cur.execute("""
+    CREATE INDEX IF NOT EXISTS normalization_jobs_pending_idx
+    ON normalization_jobs (priority, id)
+    WHERE status = 'pending'
+""")
+
+# Поиск задач с истёкшей арендой
+cur.execute("""
+    CREATE INDEX IF NOT EXISTS normalization_jobs_running_idx
+    ON normalization_jobs (lease_until)
+    WHERE status = 'running'
+""")
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: таблица normalization_jobs создана.")
@@ -0,0 +1,38 @@
+"""
+Миграция: подготовка таблицы main к пакетной загрузке профилей (/users/bulk).
+
+- description_hash — хэш описания профиля, по нему пропускаем неизменённые профили
+- уникальный индекс по user_id — нужен для INSERT ... ON CONFLICT (user_id)
+
+Запуск: python -m app.migrate_users_bulk
+
+Если в main уже есть дубликаты user_id, создание индекса упадёт —
+их нужно удалить вручную перед запуском.
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    ALTER TABLE main
+    ADD COLUMN IF NOT EXISTS description_hash TEXT
+""")
+
+cur.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS main_user_id_key
+    ON main (user_id)
+""")
+
+# Заполняем хэш для уже существующих профилей (тот же алгоритм, что в app.main)
+cur.execute("""
+    UPDATE main
+    SET description_hash = encode(sha256(convert_to(btrim(description), 'UTF8')), 'hex')
+    WHERE description IS NOT NULL AND description_hash IS NULL
+""")
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: description_hash и уникальный индекс по user_id созданы.")
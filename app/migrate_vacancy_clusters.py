@@ -0,0 +1,31 @@
+"""
+Миграция: колонки для схлопывания почти-дубликатов вакансий.
+
+- simhash    — 64-битный SimHash очищенного текста вакансии
+- cluster_id — общий id для всех копий одной вакансии
+
+Запуск: python -m app.migrate_vacancy_clusters
+После миграции заполните кластеры: python -m app.cluster_vacancies
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    ALTER TABLE messages
+    ADD COLUMN IF NOT EXISTS simhash BIGINT,
+    ADD COLUMN IF NOT EXISTS cluster_id BIGINT
+""")
+
+cur.execute("""
+    CREATE INDEX IF NOT EXISTS messages_cluster_id_idx
+    ON messages (cluster_id)
+""")
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: simhash и cluster_id добавлены в messages.")
+print("Запустите cluster_vacancies для разметки уже проиндексированных вакансий.")
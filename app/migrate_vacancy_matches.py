@@ -0,0 +1,75 @@
+"""
+Миграция: таблица предрасчитанных совпадений вакансия → кандидаты.
+
+- vacancy_user_matches — top-K кандидатов (строк main) на вакансию
+- match_refresh_state  — время и режим последнего прогона precompute_matches
+- embedded_at в messages и main — когда менялся embedding (выставляется триггером),
+  по нему precompute_matches пересчитывает только изменившееся
+
+Запуск: python -m app.migrate_vacancy_matches
+После миграции: python -m app.precompute_matches --force
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    CREATE TABLE IF NOT EXISTS vacancy_user_matches (
+        vacancy_id BIGINT NOT NULL,
+        main_id BIGINT NOT NULL,
+        score REAL NOT NULL,
+        reranked BOOLEAN NOT NULL DEFAULT FALSE,
+        computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (vacancy_id, main_id)
+    )
+""")
+
+cur.execute("""
+    CREATE INDEX IF NOT EXISTS vacancy_user_matches_score_idx
+    ON vacancy_user_matches (vacancy_id, score DESC)
+""")
+
+cur.execute("""
+    CREATE INDEX IF NOT EXISTS vacancy_user_matches_main_id_idx
+    ON vacancy_user_matches (main_id)
+""")
+
+cur.execute("""
+    CREATE TABLE IF NOT EXISTS match_refresh_state (
+        name TEXT PRIMARY KEY,
+        refreshed_at TIMESTAMPTZ NOT NULL,
+        reranked BOOLEAN NOT NULL
+    )
+""")
+
+cur.execute("""
+    CREATE OR REPLACE FUNCTION touch_embedded_at() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' OR NEW.embedding IS DISTINCT FROM OLD.embedding THEN
+            NEW.embedded_at := now();
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+""")
+
+for table in ("messages", "main"):
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedded_at TIMESTAMPTZ")
+    cur.execute(f"DROP TRIGGER IF EXISTS {table}_touch_embedded_at ON {table}")
+    cur.execute(f"""
+        CREATE TRIGGER {table}_touch_embedded_at
+        BEFORE INSERT OR UPDATE OF embedding ON {table}
+        FOR EACH ROW EXECUTE FUNCTION touch_embedded_at()
+    """)
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_embedded_at_idx
+        ON {table} (embedded_at)
+    """)
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: vacancy_user_matches и embedded_at созданы.")
+print("Запустите precompute_matches --force для первичного расчёта.")
@@ -0,0 +1,61 @@
+"""
+Миграция: партиции вакансий по профессии.
+
+- messages.partition_id — партиция вакансии (см. app.partitions)
+- vacancy_partitions    — профессия, центроид и размер каждой партиции
+- смена partition_id меняет результаты поиска — триггер версии корпуса
+  (migrate_corpus_version) начинает следить и за ней
+
+Запуск: python -m app.migrate_vacancy_partitions
+После миграции постройте партиции: python -m app.build_partitions
+"""
+from app.db import get_conn
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("""
+    ALTER TABLE messages
+    ADD COLUMN IF NOT EXISTS partition_id SMALLINT
+""")
+
+cur.execute("""
+    CREATE INDEX IF NOT EXISTS messages_partition_id_idx
+    ON messages (partition_id)
+""")
+
+cur.execute("""
+    CREATE TABLE IF NOT EXISTS vacancy_partitions (
+        id SMALLINT PRIMARY KEY,
+        occupation TEXT NOT NULL,
+        centroid vector(1024),
+        size INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+""")
+
+# перестановка вакансий по партициям должна сбрасывать кэш поиска и head-запросы
+cur.execute("SELECT 1 FROM pg_trigger WHERE tgname = 'messages_bump_corpus_version'")
+if cur.fetchone():
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'messages' AND column_name = 'cluster_id'
+    """)
+    watched_columns = ["content", "normalized", "embedding"]
+    if cur.fetchone():
+        watched_columns.append("cluster_id")
+    watched_columns.append("partition_id")
+
+    cur.execute("DROP TRIGGER messages_bump_corpus_version ON messages")
+    cur.execute(f"""
+        CREATE TRIGGER messages_bump_corpus_version
+        AFTER INSERT OR DELETE OR UPDATE OF {", ".join(watched_columns)} ON messages
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_version()
+    """)
+
+conn.commit()
+cur.close()
+conn.close()
+
+print("Миграция выполнена: partition_id и vacancy_partitions созданы.")
+print("Запустите build_partitions для разбиения вакансий и создания индексов.")
@@ -0,0 +1,71 @@
+"""
+Миграция: поля для двухфазного поиска без rerank.
+
+- is_valid        — фильтр мусорных вакансий (как is_valid_vacancy) в SQL, generated column
+- text_confidence — текстовая часть confidence (app.confidence.text_confidence)
+- частичный HNSW-индекс по embedding только для валидных вакансий
+  (строится CONCURRENTLY — запись в messages не блокируется)
+
+Поиск по индексу использует hnsw.iterative_scan — нужен pgvector >= 0.8.0.
+
+Запуск: python -m app.migrate_vacancy_scoring
+"""
+from app.db import get_conn
+from app.confidence import text_confidence
+import psycopg2.extras
+
+PGVECTOR_MIN_VERSION = (0, 8, 0)
+
+conn = get_conn()
+cur = conn.cursor()
+
+cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+row = cur.fetchone()
+version = tuple(int(part) for part in row[0].split(".")) if row else ()
+if version < PGVECTOR_MIN_VERSION:
+    raise SystemExit(
+        f"Нужен pgvector >= 0.8.0 (hnsw.iterative_scan), установлен: {row[0] if row else 'нет'}. "
+        "Обновите расширение: ALTER EXTENSION vector UPDATE"
+    )
+
+cur.execute(r"""
+    ALTER TABLE messages
+    ADD COLUMN IF NOT EXISTS is_valid BOOLEAN
+        GENERATED ALWAYS AS (char_length(btrim(content, E' \t\r\n')) >= 50) STORED,
+    ADD COLUMN IF NOT EXISTS text_confidence REAL
+""")
+conn.commit()
+
+# CREATE INDEX CONCURRENTLY нельзя выполнять в транзакции
+conn.autocommit = True
+cur.execute("""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_embedding_valid_hnsw_idx
+    ON messages USING hnsw (embedding vector_cosine_ops)
+    WHERE is_valid
+""")
+conn.autocommit = False
+
+# ---------- БЭКФИЛЛ text_confidence ----------
+read_cur = conn.cursor(name="migrate_vacancy_scoring")
+read_cur.itersize = 1000
+read_cur.execute("SELECT id, content FROM messages WHERE text_confidence IS NULL")
+updates = [(row_id, text_confidence(content or "")) for row_id, content in read_cur]
+read_cur.close()
+
+psycopg2.extras.execute_values(
+    cur,
+    """
+    UPDATE messages AS m
+    SET text_confidence = v.text_confidence
+    FROM (VALUES %s) AS v (id, text_confidence)
+    WHERE m.id = v.id
+    """,
+    updates,
+    page_size=1000
+)
+
+conn.commit()
+cur.close()
+conn.close()
+
+print(f"Миграция выполнена: is_valid и text_confidence добавлены, заполнено вакансий: {len(updates)}.")
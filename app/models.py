@@ -1,20 +1,30 @@
-import torch
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from app.settings import DEVICE, EMBEDDING_MODEL, RERANKER_MODEL
+from app.settings import DEVICE, EMBEDDING_MODEL, RERANKER_MODEL, USE_REMOTE_INFERENCE
 
 
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print("Loading embedding model...")
-embedding_model = SentenceTransformer(
-    EMBEDDING_MODEL,
-    device=DEVICE
-)
+if USE_REMOTE_INFERENCE:
+    # Модели живут в общем inference-сервере (app.inference_server),
+    # процесс API держит только лёгкие прокси
+    from app.inference_client import RemoteEmbeddingModel, RemoteRerankerModel
 
-print("Loading reranker model...")
-reranker_model = CrossEncoder(
-    RERANKER_MODEL,
-    device=DEVICE
-)
+    print("Using shared inference server...")
+    embedding_model = RemoteEmbeddingModel()
+    reranker_model = RemoteRerankerModel()
+else:
+    import torch
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+
+    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+    print("Loading embedding model...")
+    embedding_model = SentenceTransformer(
+        EMBEDDING_MODEL,
+        device=DEVICE
+    )
+
+    print("Loading reranker model...")
+    reranker_model = CrossEncoder(
+        RERANKER_MODEL,
+        device=DEVICE
+    )
 
 
 print("Models loaded.")
@@ -27,5 +37,5 @@ GENERIC_VACANCY_TEXT = (
 generic_vacancy_embedding = embedding_model.encode(
     GENERIC_VACANCY_TEXT,
     normalize_embeddings=True
-).tolist()
+)
 
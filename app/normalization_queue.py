@@ -0,0 +1,131 @@
+"""
+Очередь LLM-нормализации вакансий (таблица normalization_jobs).
+
+С NORMALIZATION_QUEUE=1 процессы API и embed_vacancies не запускают LLM сами:
+текст ставится в очередь, генерацию выполняют отдельные процессы
+app.normalization_worker. Таблица же служит хранилищем результатов.
+
+- Одинаковые тексты (по sha256) — одна задача: повторная постановка
+  возвращает готовый результат или ждёт уже поставленную задачу.
+- Приоритет: меньше — раньше. Интерактивные запросы (PRIORITY_INTERACTIVE)
+  обгоняют бэкфилл embed_vacancies (PRIORITY_BACKFILL); повторная постановка
+  с более высоким приоритетом поднимает уже ждущую задачу.
+- Задача, которую воркер держит дольше NORMALIZATION_LEASE_S, возвращается
+  в очередь (воркер упал или завис), после NORMALIZATION_MAX_ATTEMPTS — failed.
+- Если результата нет за timeout, normalize() возвращает {"error": ...} —
+  вызывающий код откатывается на правиловую нормализацию, как при ошибке LLM.
+"""
+import hashlib
+import os
+import time
+from typing import List, Optional
+
+import psycopg2.extras
+
+from app.db import get_conn
+
+
+NORMALIZATION_QUEUE = os.getenv("NORMALIZATION_QUEUE") == "1"
+# Сколько ждать результата интерактивному запросу и бэкфиллу, секунды
+NORMALIZATION_TIMEOUT_S = float(os.getenv("NORMALIZATION_TIMEOUT_S", 20))
+NORMALIZATION_BACKFILL_TIMEOUT_S = float(os.getenv("NORMALIZATION_BACKFILL_TIMEOUT_S", 600))
+NORMALIZATION_POLL_INTERVAL_S = float(os.getenv("NORMALIZATION_POLL_INTERVAL_S", 0.1))
+NORMALIZATION_LEASE_S = float(os.getenv("NORMALIZATION_LEASE_S", 300))
+NORMALIZATION_MAX_ATTEMPTS = int(os.getenv("NORMALIZATION_MAX_ATTEMPTS", 3))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKFILL = 10
+
+# Повторная постановка: приоритет только повышается, упавшая задача перезапускается
+SUBMIT_SQL = """
+    INSERT INTO normalization_jobs (text_hash, vacancy_text, priority)
+    VALUES %s
+    ON CONFLICT (text_hash) DO UPDATE
+    SET priority = LEAST(normalization_jobs.priority, EXCLUDED.priority),
+        status = CASE WHEN normalization_jobs.status = 'failed'
+                      THEN 'pending' ELSE normalization_jobs.status END,
+        attempts = CASE WHEN normalization_jobs.status = 'failed'
+                        THEN 0 ELSE normalization_jobs.attempts END
+"""
+
+
+def text_hash(vacancy_text: str) -> str:
+    # LLM видит текст без крайних пробелов (см. normalize_vacancy_llm)
+    return hashlib.sha256(vacancy_text.strip().encode("utf-8")).hexdigest()
+
+
+def submit(cur, vacancy_text: str, priority: int) -> dict:
+    """Ставит текст в очередь (или находит его задачу): id, status, result."""
+    return psycopg2.extras.execute_values(
+        cur,
+        SUBMIT_SQL + " RETURNING id, status, result",
+        [(text_hash(vacancy_text), vacancy_text, priority)],
+        fetch=True
+    )[0]
+
+
+def submit_many(vacancy_texts: List[str], priority: int = PRIORITY_BACKFILL) -> None:
+    """Ставит тексты в очередь пачкой — воркеры начинают работу, пока вызывающий идёт по списку."""
+    jobs = {text_hash(t): t for t in vacancy_texts if t}
+    if not jobs:
+        return
+    conn = get_conn()
+    cur = conn.cursor()
+    psycopg2.extras.execute_values(
+        cur,
+        SUBMIT_SQL,
+        [(h, t, priority) for h, t in jobs.items()],
+        page_size=1000
+    )
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def wait(cur, job_id: int, timeout: float) -> Optional[dict]:
+    """Ждёт завершения задачи: строка с status / result / error или None по таймауту."""
+    deadline = time.monotonic() + timeout
+    while True:
+        cur.execute(
+            "SELECT status, result, error FROM normalization_jobs WHERE id = %s",
+            (job_id,)
+        )
+        job = cur.fetchone()
+        cur.connection.commit()
+        if job is None or job["status"] in ("done", "failed"):
+            return job
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(NORMALIZATION_POLL_INTERVAL_S)
+
+
+def normalize(vacancy_text: str, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> dict:
+    """
+    Нормализация вакансии LLM. Без NORMALIZATION_QUEUE — в текущем процессе,
+    иначе — через очередь воркеров, не дольше timeout секунд.
+    """
+    if not NORMALIZATION_QUEUE:
+        from app.vacancy_normalizer import normalize_vacancy_llm
+        return normalize_vacancy_llm(vacancy_text)
+
+    if timeout is None:
+        timeout = NORMALIZATION_TIMEOUT_S if priority == PRIORITY_INTERACTIVE else NORMALIZATION_BACKFILL_TIMEOUT_S
+
+    try:
+        conn = get_conn()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        job = submit(cur, vacancy_text, priority)
+        conn.commit()
+        if job["status"] != "done":
+            job = wait(cur, job["id"], timeout)
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print("normalization_queue: unavailable:", e)
+        return {"error": "normalization queue unavailable"}
+
+    if job is None:
+        return {"error": "normalization timeout"}
+    if job["status"] != "done":
+        return {"error": "normalization failed", "raw": job.get("error")}
+    return job["result"]
@@ -0,0 +1,176 @@
+"""
+Воркеры LLM-нормализации: забирают задачи из normalization_jobs
+(см. app.normalization_queue) и выполняют normalize_vacancy_llm.
+
+Каждый воркер — отдельный процесс со своей копией LLM (или клиент общего
+inference-сервера при INFERENCE_SOCKET), поэтому генерация не занимает
+потоки API и не конкурирует с /search в его процессе. Задачи берутся по
+приоритету через FOR UPDATE SKIP LOCKED — воркеры не мешают друг другу.
+
+Запуск: python -m app.normalization_worker --workers 2
+"""
+import json
+import multiprocessing
+import sys
+import time
+
+import psycopg2.extras
+
+from app.db import get_conn
+from app.normalization_queue import (
+    NORMALIZATION_LEASE_S,
+    NORMALIZATION_MAX_ATTEMPTS,
+    NORMALIZATION_POLL_INTERVAL_S,
+)
+
+
+# Как долго хранить готовые результаты, дни
+NORMALIZATION_RESULT_TTL_DAYS = 30
+# Как часто воркер возвращает в очередь задачи с истёкшей арендой, секунды
+REAP_INTERVAL_S = 30
+
+
+def claim(conn):
+    """Берёт следующую задачу по приоритету: (id, vacancy_text) или None."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE normalization_jobs
+        SET status = 'running',
+            attempts = attempts + 1,
+            started_at = now(),
+            lease_until = now() + make_interval(secs => %s)
+        WHERE id = (
+            SELECT id
+            FROM normalization_jobs
+            WHERE status = 'pending'
+            ORDER BY priority, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, vacancy_text
+        """,
+        (NORMALIZATION_LEASE_S,)
+    )
+    job = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return job
+
+
+def complete(conn, job_id: int, result: dict) -> None:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE normalization_jobs
+        SET status = 'done', result = %s, error = NULL, finished_at = now()
+        WHERE id = %s AND status = 'running'
+        """,
+        (psycopg2.extras.Json(result), job_id)
+    )
+    conn.commit()
+    cur.close()
+
+
+def fail(conn, job_id: int, error: str) -> None:
+    """Ошибка генерации: задача возвращается в очередь, пока есть попытки."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE normalization_jobs
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+            error = %s,
+            finished_at = now()
+        WHERE id = %s AND status = 'running'
+        """,
+        (NORMALIZATION_MAX_ATTEMPTS, error, job_id)
+    )
+    conn.commit()
+    cur.close()
+
+
+def reap(conn) -> None:
+    """Возвращает в очередь задачи упавших воркеров и удаляет старые результаты."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE normalization_jobs
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+            error = 'lease expired'
+        WHERE status = 'running' AND lease_until < now()
+        """,
+        (NORMALIZATION_MAX_ATTEMPTS,)
+    )
+    if cur.rowcount:
+        print(f"Requeued {cur.rowcount} expired normalization jobs")
+    cur.execute(
+        """
+        DELETE FROM normalization_jobs
+        WHERE status IN ('done', 'failed')
+          AND finished_at < now() - make_interval(days => %s)
+        """,
+        (NORMALIZATION_RESULT_TTL_DAYS,)
+    )
+    conn.commit()
+    cur.close()
+
+
+def run_worker(worker_id: int) -> None:
+    from app.vacancy_normalizer import normalize_vacancy_llm
+
+    conn = get_conn()
+    reaped_at = 0.0
+    print(f"Normalization worker {worker_id} started")
+    while True:
+        if time.monotonic() - reaped_at >= REAP_INTERVAL_S:
+            reap(conn)
+            reaped_at = time.monotonic()
+
+        job = claim(conn)
+        if job is None:
+            time.sleep(NORMALIZATION_POLL_INTERVAL_S)
+            continue
+
+        job_id, vacancy_text = job
+        t0 = time.perf_counter()
+        try:
+            result = normalize_vacancy_llm(vacancy_text)
+        except Exception as e:
+            print(f"Normalization job {job_id} failed:", e)
+            fail(conn, job_id, repr(e))
+            continue
+        if isinstance(result, dict) and "error" in result:
+            # невалидный JSON от LLM — не кэшируем как результат, а повторяем
+            # генерацию, пока есть попытки (как было без очереди: LLM на каждый вызов)
+            print(f"Normalization job {job_id} failed:", result["error"])
+            fail(conn, job_id, json.dumps(result, ensure_ascii=False))
+            continue
+        complete(conn, job_id, result)
+        print(f"Worker {worker_id}: job {job_id} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+def main():
+    workers = 1
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+
+    # spawn: у каждого воркера своя инициализация CUDA
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=run_worker, args=(i,), daemon=True)
+        for i in range(workers)
+    ]
+    for p in processes:
+        p.start()
+
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        # задачи прерванных воркеров вернёт в очередь reap по истечении аренды
+        for p in processes:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
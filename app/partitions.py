@@ -0,0 +1,115 @@
+"""
+Партиции вакансий по профессии (occupation из LLM-нормализации).
+
+Каждая вакансия получает messages.partition_id: самые частые профессии —
+отдельные партиции, остальные — партиция 0 («прочее»). У каждой партиции
+свой частичный HNSW-индекс (WHERE partition_id = N), поэтому поиск по
+нескольким партициям трогает только их часть данных, а переиндексация
+идёт по одной партиции (см. app.build_partitions).
+
+Запрос маршрутизируется в PARTITION_PROBES партиций с ближайшими к нему
+центроидами (средний embedding партиции из vacancy_partitions).
+"""
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from app.db import get_conn
+
+
+# Сколько партиций (вместе с «прочим») строит build_partitions
+PARTITION_COUNT = int(os.getenv("PARTITION_COUNT", 16))
+# В сколько ближайших партиций идёт запрос; 0 — поиск по всей таблице
+PARTITION_PROBES = int(os.getenv("PARTITION_PROBES", 3))
+# Как часто перечитывать центроиды из БД, секунды
+PARTITION_ROUTER_TTL_S = float(os.getenv("PARTITION_ROUTER_TTL_S", 60))
+
+OTHER_PARTITION = 0
+
+
+def normalize_occupation(normalized_data) -> str:
+    if isinstance(normalized_data, list) and normalized_data and isinstance(normalized_data[0], dict):
+        normalized_data = normalized_data[0]
+    if not isinstance(normalized_data, dict) or "error" in normalized_data:
+        return ""
+    return " ".join(str(normalized_data.get("occupation") or "").lower().split())
+
+
+def partition_index_name(partition_id: int) -> str:
+    return f"messages_embedding_p{int(partition_id)}_hnsw_idx"
+
+
+class PartitionRouter:
+    def __init__(self, ttl_s: float = PARTITION_ROUTER_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._centroids = None
+        self._by_occupation = {}
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._loaded_at and now - self._loaded_at < self.ttl_s:
+            return
+
+        with self._lock:
+            if self._loaded_at and now - self._loaded_at < self.ttl_s:
+                return
+            try:
+                conn = get_conn()
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT id, occupation, centroid
+                    FROM vacancy_partitions
+                    WHERE centroid IS NOT NULL
+                    ORDER BY id
+                """)
+                rows = cur.fetchall()
+                cur.close()
+                conn.close()
+            except Exception as e:
+                print("partitions: router unavailable:", e)
+                rows = []
+
+            self._ids = np.array([r[0] for r in rows], dtype=np.int64)
+            self._by_occupation = {r[1]: r[0] for r in rows if r[1]}
+            self._centroids = (
+                np.vstack([np.asarray(r[2], dtype=np.float32) for r in rows])
+                if rows else None
+            )
+            self._loaded_at = now
+
+    def route(self, query_embedding, probes: int = PARTITION_PROBES) -> Optional[List[int]]:
+        """
+        Партиции для поиска — probes ближайших по центроиду.
+        None — партиции не построены или роутинг выключен: ищем по всей таблице.
+        """
+        if probes <= 0:
+            return None
+        self._refresh()
+        if self._centroids is None or probes >= len(self._ids):
+            return None
+
+        scores = self._centroids @ np.asarray(query_embedding, dtype=np.float32)
+        top = np.argsort(-scores)[:probes]
+        return [int(self._ids[i]) for i in top]
+
+    def partition_for(self, normalized_data) -> int:
+        """
+        Партиция для новой вакансии: по профессии, а если профессия не
+        выделена в свою партицию — «прочее».
+
+        NULL не возвращаем никогда: строка с partition_id IS NULL не попадает
+        ни в одну ветку поиска по партициям. Если партиции ещё не построены
+        (или build_partitions как раз идёт) — тоже «прочее»: следующий запуск
+        build_partitions переразложит строку по профессии.
+        """
+        self._refresh()
+        return self._by_occupation.get(normalize_occupation(normalized_data), OTHER_PARTITION)
+
+
+router = PartitionRouter()
@@ -0,0 +1,197 @@
+"""
+Предрасчёт результатов для частых запросов (таблица head_query_results).
+
+Из лога запросов /query (строки main с content) выбираются HEAD_QUERIES_TOP_N
+самых частых запросов после той же нормализации, что у кэша поиска
+(app.search_cache.normalize_query). Для каждого выполняется полный
+search_vacancies с rerank по самому частому исходному написанию запроса; embeddings запросов считаются батчами по
+HEAD_QUERIES_BATCH_SIZE, результаты пишутся в таблицу тем же батчем.
+
+Пересчитываются только запросы, посчитанные на старой версии корпуса
+(или новые в top-N), выбывшие из top-N удаляются. Запускать по расписанию,
+например из cron раз в несколько минут — после изменений messages таблица
+догонит корпус за один прогон.
+
+Запуск: python -m app.precompute_head_queries
+Полный пересчёт: python -m app.precompute_head_queries --force
+"""
+import os
+import sys
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import psycopg2.extras
+
+from app.db import get_conn
+from app.search_cache import normalize_query
+
+
+HEAD_QUERIES_TOP_N = int(os.getenv("HEAD_QUERIES_TOP_N", 1000))
+# Запросы, встретившиеся реже, в head не попадают
+HEAD_QUERIES_MIN_HITS = int(os.getenv("HEAD_QUERIES_MIN_HITS", 3))
+HEAD_QUERIES_BATCH_SIZE = int(os.getenv("HEAD_QUERIES_BATCH_SIZE", 64))
+
+
+def mine_head_queries(cur) -> List[Tuple[str, str, int]]:
+    """
+    Top-N нормализованных запросов из лога /query: [(запрос, исходный текст, число повторов)].
+    Исходный текст — самый частый вариант написания: поиск для предрасчёта
+    выполняется по нему, как живой /search (embedding и rerank зависят от регистра).
+    """
+    # грубый отбор по частоте — в Postgres, точная нормализация (как у кэша) — здесь
+    cur.execute(
+        r"""
+        SELECT content, hits
+        FROM (
+            SELECT content,
+                   count(*) AS hits,
+                   sum(count(*)) OVER (
+                       PARTITION BY lower(regexp_replace(btrim(content), '\s+', ' ', 'g'))
+                   ) AS norm_hits
+            FROM main
+            WHERE content IS NOT NULL
+            GROUP BY content
+        ) t
+        WHERE norm_hits >= %s
+        """,
+        (HEAD_QUERIES_MIN_HITS,)
+    )
+    counts = Counter()
+    variants = {}
+    for content, hits in cur.fetchall():
+        query = normalize_query(content)
+        if not query:
+            continue
+        counts[query] += hits
+        best = variants.get(query)
+        if best is None or hits > best[1]:
+            variants[query] = (content, hits)
+    return [
+        (query, variants[query][0], hits)
+        for query, hits in counts.most_common(HEAD_QUERIES_TOP_N)
+        if hits >= HEAD_QUERIES_MIN_HITS
+    ]
+
+
+def current_corpus_version(cur) -> int:
+    cur.execute("SELECT version FROM corpus_version WHERE name = 'messages'")
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("Нет версии корпуса — выполните python -m app.migrate_corpus_version")
+    return row[0]
+
+
+def write_results(conn, rows) -> None:
+    cur = conn.cursor()
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO head_query_results (query_norm, vacancy_ids, scores, hits, corpus_version)
+        VALUES %s
+        ON CONFLICT (query_norm) DO UPDATE
+        SET vacancy_ids = EXCLUDED.vacancy_ids,
+            scores = EXCLUDED.scores,
+            hits = EXCLUDED.hits,
+            corpus_version = EXCLUDED.corpus_version,
+            computed_at = now()
+        """,
+        rows
+    )
+    conn.commit()
+    cur.close()
+
+
+def main():
+    from app.models import embedding_model
+    from app.search import search_vacancies
+
+    force = "--force" in sys.argv
+    t_start = time.perf_counter()
+
+    conn = get_conn()
+    cur = conn.cursor()
+
+    head = mine_head_queries(cur)
+    # версию читаем до поиска: если корпус изменится во время прогона,
+    # строки останутся устаревшими и пересчитаются следующим запуском
+    version = current_corpus_version(cur)
+
+    head_queries = [query for query, _, _ in head]
+    cur.execute(
+        "DELETE FROM head_query_results WHERE NOT (query_norm = ANY(%s))",
+        (head_queries,)
+    )
+    conn.commit()
+
+    if force:
+        fresh = set()
+    else:
+        cur.execute(
+            "SELECT query_norm FROM head_query_results WHERE corpus_version = %s",
+            (version,)
+        )
+        fresh = {r[0] for r in cur.fetchall()}
+    hits_by_query = {query: hits for query, _, hits in head}
+    text_by_query = {query: text for query, text, _ in head}
+    # обновляем счётчик повторов и у свежих строк
+    if fresh:
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            UPDATE head_query_results h
+            SET hits = v.hits
+            FROM (VALUES %s) AS v(query_norm, hits)
+            WHERE h.query_norm = v.query_norm
+            """,
+            [(query, hits_by_query[query]) for query in fresh]
+        )
+        conn.commit()
+
+    stale = [query for query in head_queries if query not in fresh]
+    computed = 0
+    for start in range(0, len(stale), HEAD_QUERIES_BATCH_SIZE):
+        batch = stale[start:start + HEAD_QUERIES_BATCH_SIZE]
+        # поиск — по исходному тексту, как у живого /search;
+        # E5 требует префикс "query: " для запросов
+        embeddings = embedding_model.encode(
+            [f"query: {text_by_query[query]}" for query in batch],
+            batch_size=HEAD_QUERIES_BATCH_SIZE,
+            normalize_embeddings=True
+        )
+
+        rows = []
+        empty = []
+        for query, query_embedding in zip(batch, embeddings):
+            results = search_vacancies(text_by_query[query], query_embedding=query_embedding)
+            if not results:
+                empty.append(query)
+                continue
+            rows.append((
+                query,
+                [r["id"] for r in results],
+                [r["score"] for r in results],
+                hits_by_query[query],
+                version,
+            ))
+
+        if rows:
+            write_results(conn, rows)
+        if empty:
+            # пустой результат не храним — такие запросы идут обычным путём
+            cur.execute("DELETE FROM head_query_results WHERE query_norm = ANY(%s)", (empty,))
+            conn.commit()
+        computed += len(batch)
+        print(f"Processed head queries: {computed}/{len(stale)}")
+
+    cur.close()
+    conn.close()
+
+    print(
+        f"Готово. Частых запросов: {len(head_queries)}, пересчитано: {computed} "
+        f"(версия корпуса {version}), за {time.perf_counter() - t_start:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Предрасчёт совпадений вакансия → кандидаты (таблица vacancy_user_matches).
+
+Матрица embeddings вакансий (messages) умножается на матрицу embeddings
+пользователей (main) кусками через NumPy, для каждой вакансии сохраняются
+top-K пользователей. С --rerank top-K дополнительно переранжируются
+cross-encoder'ом так же, как в /vacancy/match_users.
+
+По умолчанию прогон инкрементальный (по колонкам embedded_at):
+- вакансии с изменившимся embedding пересчитываются целиком;
+- пользователи с изменившимся embedding вливаются в top-K остальных вакансий.
+Вылетевшего из top-K пользователя инкрементальный прогон на его место не вернёт —
+периодически запускайте полный пересчёт (--force).
+
+Запуск: python -m app.precompute_matches
+Полный пересчёт: python -m app.precompute_matches --force
+С rerank: python -m app.precompute_matches --rerank
+"""
+import os
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+import psycopg2.extras
+
+from app.db import get_conn
+
+
+MATCHES_TOP_K = int(os.getenv("MATCHES_TOP_K", 50))
+MATCHES_CHUNK_SIZE = int(os.getenv("MATCHES_CHUNK_SIZE", 1024))
+# Перекрытие окна инкрементального прогона: записи, закоммиченные во время
+# предыдущего прогона, всё равно попадут в следующий
+MATCHES_REFRESH_OVERLAP_S = int(os.getenv("MATCHES_REFRESH_OVERLAP_S", 300))
+STATE_NAME = "vacancy_user_matches"
+
+
+def to_matrix(embeddings) -> np.ndarray:
+    return np.vstack([np.asarray(e, dtype=np.float32) for e in embeddings])
+
+
+def load_users(cur, since=None):
+    """id, описания и матрица embeddings пользователей (только изменившихся, если задан since)."""
+    where = "AND embedded_at > %s" if since is not None else ""
+    cur.execute(
+        f"""
+        SELECT id, description, embedding
+        FROM main
+        WHERE embedding IS NOT NULL {where}
+        ORDER BY id
+        """,
+        (since,) if since is not None else ()
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), [], None
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    return ids, [r[1] for r in rows], to_matrix(r[2] for r in rows)
+
+
+def iter_vacancy_chunks(since=None, exclude_ids: Optional[List[int]] = None):
+    """Вакансии кусками по MATCHES_CHUNK_SIZE: (ids, тексты для rerank, матрица embeddings)."""
+    from app.text_normalizer import normalize_vacancy
+    from app.vacancy_normalizer import normalized_data_to_embedding_text
+
+    conditions = ["embedding IS NOT NULL"]
+    params = []
+    if since is not None:
+        conditions.append("embedded_at > %s")
+        params.append(since)
+    if exclude_ids:
+        conditions.append("NOT (id = ANY(%s))")
+        params.append(list(exclude_ids))
+
+    # серверный курсор на отдельном соединении — не тянем все вакансии в память
+    # разом, и коммиты записи результатов его не закрывают
+    conn = get_conn()
+    cur = conn.cursor(name="precompute_matches_vacancies")
+    cur.itersize = MATCHES_CHUNK_SIZE
+    cur.execute(
+        f"""
+        SELECT id, content, normalized, embedding
+        FROM messages
+        WHERE {" AND ".join(conditions)}
+        ORDER BY id
+        """,
+        params
+    )
+    while True:
+        rows = cur.fetchmany(MATCHES_CHUNK_SIZE)
+        if not rows:
+            break
+        ids = [r[0] for r in rows]
+        texts = [
+            normalized_data_to_embedding_text(r[2]) or normalize_vacancy(r[1] or "")
+            for r in rows
+        ]
+        yield ids, texts, to_matrix(r[3] for r in rows)
+    cur.close()
+    conn.close()
+
+
+def top_k_per_row(scores: np.ndarray, k: int):
+    """Индексы и значения k лучших столбцов в каждой строке, по убыванию."""
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-vals, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+
+def score_chunk(vacancy_matrix, vacancy_texts, user_ids, user_descriptions, user_matrix, rerank: bool):
+    """Список (индекс вакансии в куске, id строки main, score) для top-K по каждой вакансии."""
+    # embeddings нормализованы — скалярное произведение = cosine similarity
+    scores = vacancy_matrix @ user_matrix.T
+    idx, vals = top_k_per_row(scores, MATCHES_TOP_K)
+
+    matches = [
+        (row, int(user_ids[col]), float(val))
+        for row in range(idx.shape[0])
+        for col, val in zip(idx[row], vals[row])
+    ]
+    if not rerank or not matches:
+        return matches
+
+    from app.models import reranker_model
+
+    # те же пары, что в search_users_by_vacancy
+    user_index = {int(uid): i for i, uid in enumerate(user_ids)}
+    pairs = [
+        (f"query: {vacancy_texts[row]}", f"passage: {user_descriptions[user_index[uid]]}")
+        for row, uid, _ in matches
+    ]
+    rerank_scores = reranker_model.predict(pairs, batch_size=64)
+    return [
+        (row, uid, float(score))
+        for (row, uid, _), score in zip(matches, rerank_scores)
+    ]
+
+
+def write_matches(conn, vacancy_ids, matches, rerank: bool, replace: bool):
+    cur = conn.cursor()
+    if replace:
+        cur.execute(
+            "DELETE FROM vacancy_user_matches WHERE vacancy_id = ANY(%s)",
+            (list(vacancy_ids),)
+        )
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO vacancy_user_matches (vacancy_id, main_id, score, reranked)
+        VALUES %s
+        ON CONFLICT (vacancy_id, main_id) DO UPDATE
+        SET score = EXCLUDED.score,
+            reranked = EXCLUDED.reranked,
+            computed_at = now()
+        """,
+        [(vacancy_ids[row], uid, score, rerank) for row, uid, score in matches],
+        page_size=1000
+    )
+    conn.commit()
+    cur.close()
+
+
+def trim_matches(conn):
+    """Оставляет не больше MATCHES_TOP_K кандидатов на вакансию."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        DELETE FROM vacancy_user_matches m
+        USING (
+            SELECT vacancy_id, main_id,
+                   row_number() OVER (PARTITION BY vacancy_id ORDER BY score DESC) AS rn
+            FROM vacancy_user_matches
+        ) ranked
+        WHERE m.vacancy_id = ranked.vacancy_id
+          AND m.main_id = ranked.main_id
+          AND ranked.rn > %s
+        """,
+        (MATCHES_TOP_K,)
+    )
+    conn.commit()
+    cur.close()
+
+
+def cleanup_matches(conn):
+    """Удаляет совпадения для удалённых вакансий и пользователей."""
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM vacancy_user_matches m
+        WHERE NOT EXISTS (SELECT 1 FROM messages v WHERE v.id = m.vacancy_id AND v.embedding IS NOT NULL)
+           OR NOT EXISTS (SELECT 1 FROM main u WHERE u.id = m.main_id AND u.embedding IS NOT NULL)
+    """)
+    conn.commit()
+    cur.close()
+
+
+def main():
+    force = "--force" in sys.argv
+    rerank = "--rerank" in sys.argv
+    t_start = time.perf_counter()
+
+    conn = get_conn()
+    cur = conn.cursor()
+
+    cur.execute("SELECT now()")
+    started_at = cur.fetchone()[0]
+
+    cur.execute(
+        "SELECT refreshed_at, reranked FROM match_refresh_state WHERE name = %s",
+        (STATE_NAME,)
+    )
+    state = cur.fetchone()
+    # смена режима rerank делает старые score несравнимыми — только полный пересчёт
+    full = force or state is None or state[1] != rerank
+    since = None
+    if not full:
+        cur.execute(
+            "SELECT %s::timestamptz - make_interval(secs => %s)",
+            (state[0], MATCHES_REFRESH_OVERLAP_S)
+        )
+        since = cur.fetchone()[0]
+
+    user_ids, user_descriptions, user_matrix = load_users(cur)
+    if user_matrix is None:
+        print("Нет пользователей с embeddings — нечего считать.")
+        cur.close()
+        conn.close()
+        return
+
+    # ---------- 1. ВАКАНСИИ: ПОЛНЫЙ ПЕРЕСЧЁТ СТРОК ----------
+    refreshed_vacancies = []
+    for vacancy_ids, texts, vacancy_matrix in iter_vacancy_chunks(since=since):
+        matches = score_chunk(vacancy_matrix, texts, user_ids, user_descriptions, user_matrix, rerank)
+        write_matches(conn, vacancy_ids, matches, rerank, replace=True)
+        refreshed_vacancies.extend(vacancy_ids)
+        print(f"Processed vacancies: {len(refreshed_vacancies)}")
+
+    # ---------- 2. ИЗМЕНИВШИЕСЯ ПОЛЬЗОВАТЕЛИ: ВЛИВАЕМ В ОСТАЛЬНЫЕ ВАКАНСИИ ----------
+    if not full:
+        changed_ids, changed_descriptions, changed_matrix = load_users(cur, since=since)
+        if changed_matrix is not None:
+            cur.execute(
+                "DELETE FROM vacancy_user_matches WHERE main_id = ANY(%s) AND NOT (vacancy_id = ANY(%s))",
+                (changed_ids.tolist(), refreshed_vacancies)
+            )
+            conn.commit()
+            merged = 0
+            for vacancy_ids, texts, vacancy_matrix in iter_vacancy_chunks(exclude_ids=refreshed_vacancies):
+                matches = score_chunk(vacancy_matrix, texts, changed_ids, changed_descriptions, changed_matrix, rerank)
+                write_matches(conn, vacancy_ids, matches, rerank, replace=False)
+                merged += len(vacancy_ids)
+            trim_matches(conn)
+            print(f"Merged {len(changed_ids)} changed users into {merged} vacancies")
+
+    cleanup_matches(conn)
+
+    cur.execute(
+        """
+        INSERT INTO match_refresh_state (name, refreshed_at, reranked)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET refreshed_at = EXCLUDED.refreshed_at, reranked = EXCLUDED.reranked
+        """,
+        (STATE_NAME, started_at, rerank)
+    )
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    mode = "full" if full else "incremental"
+    print(
+        f"Готово ({mode}). Вакансий пересчитано: {len(refreshed_vacancies)}, "
+        f"за {time.perf_counter() - t_start:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
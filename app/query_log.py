@@ -0,0 +1,145 @@
+"""
+Write-behind логирование запросов /query в таблицу main.
+
+Запрос кладётся в ограниченный буфер в памяти и сразу возвращает управление,
+фоновый поток сбрасывает буфер пачками (по размеру или по интервалу)
+одним multi-row INSERT. Поиск никогда не ждёт записи в БД.
+
+При переполнении буфера срабатывает политика QUERY_LOG_OVERFLOW:
+- drop_oldest — выбрасываем самые старые запросы (по умолчанию)
+- drop_newest — выбрасываем новый запрос
+"""
+import os
+import threading
+from collections import deque
+from typing import List
+
+import psycopg2.extras
+
+from app.db import get_conn
+
+
+QUERY_LOG_MAX_SIZE = int(os.getenv("QUERY_LOG_MAX_SIZE", 10000))
+QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", 500))
+QUERY_LOG_FLUSH_INTERVAL = float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", 2.0))
+QUERY_LOG_OVERFLOW = os.getenv("QUERY_LOG_OVERFLOW", "drop_oldest")
+
+
+class QueryLogBuffer:
+    def __init__(
+        self,
+        max_size: int = QUERY_LOG_MAX_SIZE,
+        batch_size: int = QUERY_LOG_BATCH_SIZE,
+        flush_interval: float = QUERY_LOG_FLUSH_INTERVAL,
+        overflow: str = QUERY_LOG_OVERFLOW,
+    ):
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Неизвестная политика переполнения: {overflow}")
+
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+
+        self.stats = {"logged": 0, "written": 0, "dropped": 0, "failed_flushes": 0}
+
+    def log(self, content: str) -> None:
+        """Кладёт запрос в буфер. Никогда не блокируется на БД."""
+        with self._lock:
+            if len(self._buffer) >= self.max_size:
+                self.stats["dropped"] += 1
+                if self.overflow == "drop_newest":
+                    return
+                self._buffer.popleft()
+            self._buffer.append(content)
+            self.stats["logged"] += 1
+            full = len(self._buffer) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Останавливает фоновый поток и сбрасывает остаток буфера в БД."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._close_conn()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        # финальный сброс при остановке
+        self.flush()
+
+    def flush(self) -> None:
+        while True:
+            with self._lock:
+                batch = [
+                    self._buffer.popleft()
+                    for _ in range(min(self.batch_size, len(self._buffer)))
+                ]
+            if not batch:
+                return
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                self._close_conn()
+                self._requeue(batch)
+                self.stats["failed_flushes"] += 1
+                print("query_log flush failed:", e)
+                return
+
+            self.stats["written"] += len(batch)
+
+    def _write(self, batch: List[str]) -> None:
+        if self._conn is None:
+            self._conn = get_conn()
+        cur = self._conn.cursor()
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO main (content) VALUES %s",
+            [(content,) for content in batch],
+            page_size=len(batch)
+        )
+        self._conn.commit()
+        cur.close()
+
+    def _requeue(self, batch: List[str]) -> None:
+        # Возвращаем пачку в начало буфера, чтобы повторить на следующем сбросе.
+        # Если места не хватает — выбрасываем самые старые запросы из пачки.
+        with self._lock:
+            room = max(0, self.max_size - len(self._buffer))
+            keep = batch[len(batch) - room:] if room < len(batch) else batch
+            self.stats["dropped"] += len(batch) - len(keep)
+            self._buffer.extendleft(reversed(keep))
+
+    def _close_conn(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+query_log = QueryLogBuffer()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class EmbedRequest(BaseModel):
     text: str
@@ -20,8 +20,14 @@ class RerankResponse(BaseModel):
 
 
 class VacancyMatchRequest(BaseModel):
-    """Запрос на поиск пользователей по вакансии."""
-    vacancy_text: str
+    """
+    Запрос на поиск пользователей по вакансии.
+    vacancy_id — вакансия из messages: отдаётся предрасчёт из vacancy_user_matches
+    или подбор по сохранённым normalized / embedding,
+    vacancy_text — используется, если такой вакансии в messages нет.
+    """
+    vacancy_text: Optional[str] = None
+    vacancy_id: Optional[int] = None
     top_n: int = 10
 
 
@@ -29,3 +35,8 @@ class AddUserRequest(BaseModel):
     """Добавление пользователя (профиль/резюме)."""
     description: str
     user_id: int
+
+
+class BulkAddUsersRequest(BaseModel):
+    """Пакетное добавление/обновление пользователей."""
+    users: List[AddUserRequest]
@@ -1,37 +1,77 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import os
 import time
 import psycopg2.extras
 import json
+import numpy as np
 
 from app.models import embedding_model, reranker_model
 from app.db import get_conn
 from app.text_normalizer import normalize_vacancy
-from app.vacancy_normalizer import normalize_vacancy_llm, normalized_data_to_embedding_text
-from app.confidence import compute_confidence
+from app.vacancy_normalizer import normalized_data_to_embedding_text
+from app import normalization_queue
 from app.models import generic_vacancy_embedding
+from app.budget import Deadline
+from app.partitions import router as partition_router
 
 
 # Ограничение применяется после финального расчёта (rerank + confidence)
 TOP_K = int(os.getenv("TOP_K", 50))
 
-
-def parse_pgvector(raw_embedding) -> List[float]:
+# Во сколько раз больше ближайших строк берём из индекса, чтобы после
+# схлопывания почти-дубликатов (один представитель на cluster_id) кандидатов хватило
+DEDUP_OVERFETCH = int(os.getenv("DEDUP_OVERFETCH", 3))
+
+# ---------- ПОСТРАНИЧНАЯ ВЫБОРКА КАНДИДАТОВ ----------
+# Кандидаты читаются из индекса страницами и скорятся по мере чтения; выборка
+# останавливается, как только набралось достаточно результатов (или дальше
+# ни одна строка не может пройти порог). *_MAX_CANDIDATES — верхняя граница.
+RERANK_PAGE_SIZE = int(os.getenv("RERANK_PAGE_SIZE", 25))
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", 100))
+# Для rerank-скоринга distance не ограничивает score сверху — дальше этого
+# distance кандидатов не берём (0 — без ограничения)
+RERANK_MAX_DISTANCE = float(os.getenv("RERANK_MAX_DISTANCE", 0))
+SCORE_PAGE_SIZE = int(os.getenv("SCORE_PAGE_SIZE", 200))
+SCORE_MAX_CANDIDATES = int(os.getenv("SCORE_MAX_CANDIDATES", 1000))
+# Максимальный confidence — верхняя граница score без rerank:
+# text_confidence <= 0.4 + 0.3, embedding-часть 0.3 × (1 - sim) <= 0.3 × 2
+MAX_CONFIDENCE = 0.4 + 0.3 + 0.3 * 2
+
+# ---------- ДЕГРАДАЦИЯ ПО БЮДЖЕТУ (см. app.budget) ----------
+# Меньше стольких кандидатов rerank не делаем — переходим на скоринг без rerank
+MIN_RERANK_CANDIDATES = int(os.getenv("MIN_RERANK_CANDIDATES", 10))
+# Запас бюджета на confidence / сортировку / ответ после rerank, мс
+RERANK_RESERVE_MS = float(os.getenv("RERANK_RESERVE_MS", 50))
+# Запас бюджета на сортировку / подтягивание content / ответ в поиске без rerank, мс
+HYDRATE_RESERVE_MS = float(os.getenv("HYDRATE_RESERVE_MS", 20))
+# Оценка стоимости rerank одной пары, мс; уточняется по фактическим замерам (EWMA)
+_rerank_ms_per_pair = float(os.getenv("RERANK_MS_PER_PAIR", 5))
+
+# Confidence вакансии в SQL: text_confidence + 0.3 × max(0, 1 - cos(embedding, generic)).
+# Embeddings нормализованы, <#> — отрицательное скалярное произведение. Так сами
+# векторы (1024 float) не возвращаются из БД ради одного скалярного произведения.
+SCORING_COLUMNS = """id,
+                COALESCE(cluster_id, id) AS cluster,
+                text_confidence,
+                embedding <#> %(generic)s::vector AS neg_generic_similarity"""
+CONFIDENCE_SQL = "text_confidence + 0.3 * GREATEST(0, 1 + neg_generic_similarity)"
+
+
+def parse_pgvector(raw_embedding) -> np.ndarray:
     """
-    Приводит embedding из pgvector к List[float]
-    psycopg2 может вернуть:
-    - строку "[0.1, 0.2, ...]"
-    - список Decimal
+    Приводит embedding из pgvector к contiguous float32 np.ndarray.
+    register_vector (app.db) уже отдаёт np.ndarray float32 — тогда без копии;
+    строка "[0.1, 0.2, ...]" — если адаптер не зарегистрирован.
     """
     if raw_embedding is None:
-        return []
+        return np.empty(0, dtype=np.float32)
 
     if isinstance(raw_embedding, str):
-        return [float(x) for x in json.loads(raw_embedding)]
+        return np.array(json.loads(raw_embedding), dtype=np.float32)
+
+    return np.ascontiguousarray(raw_embedding, dtype=np.float32)
 
-    # list / tuple / Decimal[]
-    return [float(x) for x in raw_embedding]
 
 def is_valid_vacancy(text: str) -> bool:
     """
@@ -43,121 +83,381 @@ def is_valid_vacancy(text: str) -> bool:
     return len(text.strip()) >= 50
 
 
-def search_vacancies(user_query: str) -> List[Dict[str, Any]]:
-    t_start = time.perf_counter()
-    metrics = {}
+# Верхняя граница hnsw.ef_search в pgvector
+HNSW_EF_SEARCH_MAX = 1000
 
-    # ---------- 1. EMBEDDING ЗАПРОСА ----------
-    t0 = time.perf_counter()
-    query_text = (
-        "Задача: найти подходящую вакансию по запросу кандидата.\n"
-        f"Запрос пользователя: {user_query}"
-    )
 
-    # E5 требует префикс "query: " для запросов (иначе качество сильно падает)
-    query_embedding = embedding_model.encode(
-        f"query: {user_query}",
-        normalize_embeddings=True
-    ).tolist()
-    metrics["embedding_ms"] = (time.perf_counter() - t0) * 1000
+def configure_hnsw_scan(conn, fetch_limit: int) -> None:
+    """
+    Настройки HNSW-обхода на текущую транзакцию (SET LOCAL).
 
-    # ---------- 2. VECTOR SEARCH В POSTGRES ----------
-    t0 = time.perf_counter()
-    conn = get_conn()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    По умолчанию индекс отдаёт не больше hnsw.ef_search = 40 строк, а фильтры
+    (text_confidence, партиция) и схлопывание дубликатов работают уже после него —
+    LIMIT %(fetch_limit)s без этого не набирается. iterative_scan (pgvector >= 0.8)
+    продолжает обход индекса, пока LIMIT не наберётся.
 
+    strict_order, а не relaxed_order: при relaxed_order строки могут прийти не по
+    возрастанию distance, а ORDER BY поверх индексного обхода их не пересортирует.
+    Постраничное чтение (page[-1]["distance"], distance_scoring_exhausted,
+    rows[:rerank_count]) рассчитывает на монотонный distance.
+    """
+    cur = conn.cursor()
     cur.execute(
-        """
-        SELECT
-            id,
-            content,
-            normalized,
-            embedding,
-            embedding <=> %s::vector AS distance
-        FROM messages
-        WHERE embedding IS NOT NULL
-        ORDER BY distance
-        LIMIT 100;
-        """,
-        (query_embedding,)
+        "SET LOCAL hnsw.ef_search = %s",
+        (min(max(fetch_limit, 40), HNSW_EF_SEARCH_MAX),)
     )
-
-    rows = cur.fetchall()
+    cur.execute("SET LOCAL hnsw.iterative_scan = strict_order")
     cur.close()
-    conn.close()
-    metrics["vector_search_ms"] = (time.perf_counter() - t0) * 1000
 
-    if not rows:
-        metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
-        print("search_vacancies metrics:", metrics)
-        return []
 
-    # ---------- 3. ФИЛЬТР МУСОРА ----------
-    t0 = time.perf_counter()
-    rows = [
-        r for r in rows
-        if is_valid_vacancy(r["content"])
-    ]
-    metrics["filter_ms"] = (time.perf_counter() - t0) * 1000
+def nearest_vacancies_sql(columns: str, conditions: str = "", partitions: Optional[List[int]] = None) -> str:
+    """
+    Запрос ближайших к %(query)s валидных вакансий (LIMIT %(fetch_limit)s) для CTE nearest.
+    С партициями — UNION ALL по партициям: у каждой свой частичный HNSW-индекс
+    (WHERE partition_id = N AND is_valid, см. app.build_partitions).
+    Выполнять после configure_hnsw_scan: SET LOCAL действует на каждую ветку,
+    иначе каждая партиция отдаёт не больше ef_search строк.
+    """
+    def branch(extra: str) -> str:
+        return f"""
+            SELECT
+                {columns},
+                embedding <=> %(query)s::vector AS distance
+            FROM messages
+            WHERE embedding IS NOT NULL
+              AND is_valid{conditions}{extra}
+            ORDER BY distance
+            LIMIT %(fetch_limit)s
+        """
 
-    if not rows:
-        metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
-        print("search_vacancies metrics:", metrics)
-        return []
+    if not partitions:
+        return branch("")
 
-    # ---------- 4. RERANK ----------
-    t0 = time.perf_counter()
-    documents = [
-        normalized_data_to_embedding_text(r["normalized"]) or normalize_vacancy(r["content"])
-        for r in rows
+    branches = [
+        f"({branch(f' AND partition_id = {int(partition_id)}')})"
+        for partition_id in partitions
     ]
+    return "\n            UNION ALL\n".join(branches) + """
+            ORDER BY distance
+            LIMIT %(fetch_limit)s
+        """
 
-    pairs = [
-        (f"query: {user_query}", f"passage: {doc}")
-        for doc in documents
+
+def iter_vacancy_pages(
+    query_embedding,
+    page_size: int,
+    max_candidates: int,
+    partitions: Optional[List[int]] = None,
+    with_content: bool = False
+):
+    """
+    Ближайшие к запросу вакансии страницами по page_size строк индекса, по мере
+    удаления от запроса. Из каждого кластера почти-дубликатов отдаётся только
+    самая близкая вакансия (невразмеченные — отдельные кластеры).
+
+    Отдаёт (строки страницы, distance последней прочитанной строки).
+    У строк есть id, distance и confidence (CONFIDENCE_SQL), а с with_content —
+    ещё content и normalized. partitions — в каких партициях искать (None — везде).
+    """
+    nearest_sql = nearest_vacancies_sql(
+        SCORING_COLUMNS,
+        conditions="\n              AND text_confidence IS NOT NULL",
+        partitions=partitions
+    )
+    content_columns = ",\n            m.content,\n            m.normalized" if with_content else ""
+    content_join = "JOIN messages m ON m.id = n.id" if with_content else ""
+
+    fetch_limit = max_candidates * DEDUP_OVERFETCH
+
+    conn = get_conn()
+    # в той же транзакции, что и серверный курсор ниже
+    configure_hnsw_scan(conn, fetch_limit)
+    # серверный курсор: строки читаются из индекса только по мере надобности
+    cur = conn.cursor(name="vacancy_pages", cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute(
+            f"""
+            SELECT
+                n.id,
+                n.cluster,
+                n.distance,
+                {CONFIDENCE_SQL} AS confidence{content_columns}
+            FROM (
+                {nearest_sql}
+            ) n
+            {content_join}
+            ORDER BY n.distance;
+            """,
+            {
+                "query": query_embedding,
+                "generic": generic_vacancy_embedding,
+                "fetch_limit": fetch_limit,
+            }
+        )
+
+        seen_clusters = set()
+        candidates = 0
+        while candidates < max_candidates:
+            page = cur.fetchmany(page_size)
+            if not page:
+                break
+
+            rows = []
+            for row in page:
+                if row["cluster"] in seen_clusters:
+                    continue
+                seen_clusters.add(row["cluster"])
+                rows.append(row)
+
+            rows = rows[:max_candidates - candidates]
+            candidates += len(rows)
+            yield rows, float(page[-1]["distance"])
+    finally:
+        cur.close()
+        conn.close()
+
+
+def rerank_capacity(deadline: Deadline, candidates: int) -> int:
+    """Сколько кандидатов успеем переранжировать в оставшийся бюджет."""
+    available_ms = deadline.remaining_ms() - RERANK_RESERVE_MS
+    if available_ms <= 0:
+        return 0
+    return min(candidates, int(available_ms / _rerank_ms_per_pair))
+
+
+def _observe_rerank(pairs_count: int, elapsed_ms: float) -> None:
+    global _rerank_ms_per_pair
+    if pairs_count:
+        _rerank_ms_per_pair = 0.8 * _rerank_ms_per_pair + 0.2 * (elapsed_ms / pairs_count)
+
+
+def distance_scores(rows: List[Dict[str, Any]]) -> np.ndarray:
+    """FINAL SCORE = (1 - distance) × confidence — сразу для всех кандидатов."""
+    distances = np.fromiter((r["distance"] for r in rows), dtype=np.float32, count=len(rows))
+    confidences = np.fromiter((r["confidence"] for r in rows), dtype=np.float32, count=len(rows))
+    return np.maximum(0.0, 1.0 - distances) * confidences
+
+
+def distance_scoring_exhausted(results: List[Dict[str, Any]], last_distance: float, needed: int) -> bool:
+    """
+    Можно ли прекратить чтение кандидатов при скоринге без rerank.
+    FINAL SCORE = (1 - distance) × confidence <= (1 - distance) × MAX_CONFIDENCE,
+    а distance по страницам только растёт: True — дальше ни одна вакансия
+    не пройдёт порог 0.5 или не попадёт в top-needed.
+    """
+    best_possible = max(0.0, 1.0 - last_distance) * MAX_CONFIDENCE
+    if best_possible < 0.5:
+        return True
+    if len(results) < needed:
+        return False
+    kth_score = sorted((r["score"] for r in results), reverse=True)[needed - 1]
+    return best_possible <= kth_score
+
+
+def score_by_distance(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Скоринг без rerank: distance_scores с порогом 0.5."""
+    final_scores = distance_scores(rows)
+    return [
+        {
+            "id": rows[i]["id"],
+            "content": rows[i]["content"],
+            "score": float(final_scores[i])
+        }
+        for i in np.flatnonzero(final_scores >= 0.5)
     ]
 
-    rerank_scores = reranker_model.predict(pairs, batch_size=16)
-    metrics["rerank_ms"] = (time.perf_counter() - t0) * 1000
 
-    # ---------- 5. FINAL SCORE = semantic × confidence ----------
-    t0 = time.perf_counter()
-    results = []
+def search_vacancies(
+    user_query: str,
+    deadline: Optional[Deadline] = None,
+    limit: int = TOP_K,
+    query_embedding=None
+) -> List[Dict[str, Any]]:
+    """
+    Поиск вакансий с rerank. Кандидаты читаются и переранжируются страницами,
+    пока не наберётся limit результатов (не больше RERANK_MAX_CANDIDATES).
 
-    for row, semantic_score in zip(rows, rerank_scores):
-        vacancy_embedding = parse_pgvector(row["embedding"])
+    Если передан deadline — укладываемся в бюджет: при нехватке времени
+    сокращаем число кандидатов в rerank, а если и на MIN_RERANK_CANDIDATES
+    времени нет — считаем score без rerank.
+    Выбранный путь записывается в deadline.degradation.
+
+    query_embedding — уже посчитанный embedding запроса (батчевые прогоны,
+    см. app.precompute_head_queries).
+    """
+    t_start = time.perf_counter()
+    metrics = {}
+
+    # ---------- 1. EMBEDDING ЗАПРОСА ----------
+    t0 = time.perf_counter()
+    query_text = (
+        "Задача: найти подходящую вакансию по запросу кандидата.\n"
+        f"Запрос пользователя: {user_query}"
+    )
 
-        confidence = compute_confidence(
-            text=row["content"],
-            vacancy_embedding=vacancy_embedding,
-            generic_embedding=generic_vacancy_embedding
+    # E5 требует префикс "query: " для запросов (иначе качество сильно падает)
+    if query_embedding is None:
+        query_embedding = embedding_model.encode(
+            f"query: {user_query}",
+            normalize_embeddings=True
         )
+    metrics["embedding_ms"] = (time.perf_counter() - t0) * 1000
 
-        final_score = float(semantic_score) * confidence
+    # ---------- 2-5. ПОСТРАНИЧНО: VECTOR SEARCH → RERANK → FINAL SCORE ----------
+    # Останавливаемся, как только набралось limit результатов с final_score >= 0.3
+    partitions = partition_router.route(query_embedding)
+    metrics["partitions"] = partitions
+    metrics.update(vector_search_ms=0.0, rerank_ms=0.0, confidence_ms=0.0, pages=0)
+    candidates_count = 0
+    results = []
 
-        if final_score >= 0.3:
-            results.append({
-                "id": row["id"],
-                "content": row["content"],
-                "score": final_score
-            })
-    metrics["confidence_ms"] = (time.perf_counter() - t0) * 1000
+    pages = iter_vacancy_pages(
+        query_embedding,
+        page_size=RERANK_PAGE_SIZE,
+        max_candidates=RERANK_MAX_CANDIDATES,
+        partitions=partitions,
+        with_content=True
+    )
+    t0 = time.perf_counter()
+    for rows, last_distance in pages:
+        metrics["vector_search_ms"] += (time.perf_counter() - t0) * 1000
+        metrics["pages"] += 1
+
+        # ---------- 3. ФИЛЬТР МУСОРА ----------
+        rows = [
+            r for r in rows
+            if is_valid_vacancy(r["content"])
+        ]
+
+        # ---------- 4. RERANK (в пределах бюджета) ----------
+        # после перехода на no_rerank ёмкость rerank больше не проверяем: иначе
+        # на следующей странице elif ниже переключил бы на reduced_rerank и
+        # смешал score без rerank с rerank × confidence
+        no_rerank = deadline is not None and deadline.degradation == "no_rerank"
+        last_page = False
+        if deadline is not None and rows and not no_rerank:
+            rerank_count = rerank_capacity(deadline, len(rows))
+            if candidates_count == 0 and rerank_count < min(MIN_RERANK_CANDIDATES, len(rows)):
+                deadline.degrade("no_rerank")
+            elif rerank_count < len(rows):
+                deadline.degrade("reduced_rerank")
+                # кандидаты отсортированы по distance — отрезаем самые дальние
+                rows = rows[:rerank_count]
+                last_page = True
+            no_rerank = deadline.degradation == "no_rerank"
+
+        if no_rerank:
+            # скоринг как в search_vacancies_without_rerank — дешёвый, дочитываем
+            # страницы, пока хватает бюджета
+            t1 = time.perf_counter()
+            results.extend(score_by_distance(rows))
+            metrics["confidence_ms"] += (time.perf_counter() - t1) * 1000
+            candidates_count += len(rows)
+            if distance_scoring_exhausted(results, last_distance, min(limit, TOP_K)):
+                break
+            if deadline.remaining_ms() <= HYDRATE_RESERVE_MS:
+                break
+            t0 = time.perf_counter()
+            continue
+
+        if rows:
+            t1 = time.perf_counter()
+            documents = [
+                normalized_data_to_embedding_text(r["normalized"]) or normalize_vacancy(r["content"])
+                for r in rows
+            ]
+
+            pairs = [
+                (f"query: {user_query}", f"passage: {doc}")
+                for doc in documents
+            ]
+
+            rerank_scores = reranker_model.predict(pairs, batch_size=16)
+            rerank_ms = (time.perf_counter() - t1) * 1000
+            metrics["rerank_ms"] += rerank_ms
+            _observe_rerank(len(pairs), rerank_ms)
+
+            # ---------- 5. FINAL SCORE = semantic × confidence ----------
+            t1 = time.perf_counter()
+            confidences = np.fromiter((r["confidence"] for r in rows), dtype=np.float32, count=len(rows))
+            final_scores = np.asarray(rerank_scores, dtype=np.float32) * confidences
+
+            results.extend(
+                {
+                    "id": rows[i]["id"],
+                    "content": rows[i]["content"],
+                    "score": float(final_scores[i])
+                }
+                for i in np.flatnonzero(final_scores >= 0.3)
+            )
+            metrics["confidence_ms"] += (time.perf_counter() - t1) * 1000
+            candidates_count += len(rows)
+
+        if last_page or len(results) >= limit:
+            break
+        if RERANK_MAX_DISTANCE and last_distance > RERANK_MAX_DISTANCE:
+            break
+        t0 = time.perf_counter()
+    pages.close()
+
+    if not results:
+        metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
+        metrics["candidates_count"] = candidates_count
+        print("search_vacancies metrics:", metrics)
+        return []
 
     # ---------- 6. SORT И ФИНАЛЬНЫЙ ФИЛЬТР ----------
     t0 = time.perf_counter()
     results.sort(key=lambda x: x["score"], reverse=True)
-    results = results[:TOP_K]
+    results = results[:min(limit, TOP_K)]
     metrics["sort_ms"] = (time.perf_counter() - t0) * 1000
 
     metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
-    metrics["candidates_count"] = len(rows)
+    metrics["candidates_count"] = candidates_count
     metrics["results_count"] = len(results)
+    if deadline is not None:
+        metrics["degradation"] = deadline.degradation
     print("search_vacancies metrics:", metrics)
 
     return results
     
 
-def search_vacancies_without_rerank(user_query: str) -> List[Dict[str, Any]]:
+def hydrate_vacancies(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Фаза 2: подтягивает content только для вакансий, которые уйдут в ответ."""
+    if not results:
+        return results
+
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, content FROM messages WHERE id = ANY(%s)",
+        ([r["id"] for r in results],)
+    )
+    contents = dict(cur.fetchall())
+    cur.close()
+    conn.close()
+
+    return [
+        {**r, "content": contents[r["id"]]}
+        for r in results
+        if r["id"] in contents
+    ]
+
+
+def search_vacancies_without_rerank(
+    user_query: str,
+    limit: int = TOP_K,
+    deadline: Optional[Deadline] = None
+) -> List[Dict[str, Any]]:
+    """
+    Поиск без rerank в две фазы: сначала id + scalar-поля для скоринга
+    (страницами, пока результат ещё может улучшиться), затем content
+    только для limit лучших результатов.
+
+    Если передан deadline и бюджет кончается раньше, чем выборка остановилась
+    сама, лучшие результаты отдаются по прочитанным страницам
+    (deadline.degradation = "truncated").
+    """
     t_start = time.perf_counter()
     metrics = {}
 
@@ -167,91 +467,136 @@ def search_vacancies_without_rerank(user_query: str) -> List[Dict[str, Any]]:
     query_embedding = embedding_model.encode(
         f"query: {user_query}",
         normalize_embeddings=True
-    ).tolist()
+    )
     metrics["embedding_ms"] = (time.perf_counter() - t0) * 1000
 
-    # ---------- 2. VECTOR SEARCH В POSTGRES ----------
-    t0 = time.perf_counter()
-    conn = get_conn()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    # ---------- 2-3. ПОСТРАНИЧНО: VECTOR SEARCH (id, distance, confidence) → FINAL SCORE ----------
+    # читаем, пока результат ещё может улучшиться (distance_scoring_exhausted)
+    needed = min(limit, TOP_K)
+    partitions = partition_router.route(query_embedding)
+    metrics["partitions"] = partitions
+    metrics.update(vector_search_ms=0.0, confidence_ms=0.0, pages=0)
+    candidates_count = 0
+    results = []
 
-    cur.execute(
-        """
-        SELECT
-            id,
-            content,
-            normalized,
-            embedding,
-            embedding <=> %s::vector AS distance
-        FROM messages
-        WHERE embedding IS NOT NULL
-        ORDER BY distance
-        LIMIT 1000;
-        """,
-        (query_embedding,)
+    pages = iter_vacancy_pages(
+        query_embedding,
+        page_size=SCORE_PAGE_SIZE,
+        max_candidates=SCORE_MAX_CANDIDATES,
+        partitions=partitions
     )
-
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    metrics["vector_search_ms"] = (time.perf_counter() - t0) * 1000
-
-    if not rows:
-        metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
-        print("search_vacancies_without_rerank metrics:", metrics)
-        return []
-
-    # ---------- 3. ФИЛЬТР МУСОРА ----------
     t0 = time.perf_counter()
-    rows = [
-        r for r in rows
-        if is_valid_vacancy(r["content"])
-    ]
-    metrics["filter_ms"] = (time.perf_counter() - t0) * 1000
-
-    if not rows:
+    for rows, last_distance in pages:
+        metrics["vector_search_ms"] += (time.perf_counter() - t0) * 1000
+        metrics["pages"] += 1
+        candidates_count += len(rows)
+
+        t1 = time.perf_counter()
+        if rows:
+            final_scores = distance_scores(rows)
+            results.extend(
+                {
+                    "id": rows[i]["id"],
+                    "score": float(final_scores[i])
+                }
+                for i in np.flatnonzero(final_scores >= 0.5)
+            )
+        metrics["confidence_ms"] += (time.perf_counter() - t1) * 1000
+
+        if distance_scoring_exhausted(results, last_distance, needed):
+            break
+        if deadline is not None and deadline.remaining_ms() <= HYDRATE_RESERVE_MS:
+            deadline.degrade("truncated")
+            break
+        t0 = time.perf_counter()
+    pages.close()
+
+    if not results:
         metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
+        metrics["candidates_count"] = candidates_count
         print("search_vacancies_without_rerank metrics:", metrics)
         return []
 
-    # ---------- 4. FINAL SCORE = (1 - distance) × confidence ----------
-    t0 = time.perf_counter()
-    results = []
-
-    for row in rows:
-        semantic_score = max(0.0, 1.0 - float(row["distance"]))
-        vacancy_embedding = parse_pgvector(row["embedding"])
-
-        confidence = compute_confidence(
-            text=row["content"],
-            vacancy_embedding=vacancy_embedding,
-            generic_embedding=generic_vacancy_embedding
-        )
-
-        final_score = float(semantic_score) * confidence
-
-        if final_score >= 0.5:
-            results.append({
-                "id": row["id"],
-                "content": row["content"],
-                "score": final_score
-            })
-    metrics["confidence_ms"] = (time.perf_counter() - t0) * 1000
-
-    # ---------- 6. SORT И ФИНАЛЬНЫЙ ФИЛЬТР ----------
+    # ---------- 4. SORT И ФИНАЛЬНЫЙ ФИЛЬТР ----------
     t0 = time.perf_counter()
     results.sort(key=lambda x: x["score"], reverse=True)
-    results = results[:TOP_K]
+    results = results[:needed]
     metrics["sort_ms"] = (time.perf_counter() - t0) * 1000
 
+    # ---------- 5. HYDRATE: content только для финальной страницы ----------
+    t0 = time.perf_counter()
+    results = hydrate_vacancies(results)
+    metrics["hydrate_ms"] = (time.perf_counter() - t0) * 1000
+
     metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
-    metrics["candidates_count"] = len(rows)
+    metrics["candidates_count"] = candidates_count
     metrics["results_count"] = len(results)
+    if deadline is not None:
+        metrics["degradation"] = deadline.degradation
     print("search_vacancies_without_rerank metrics:", metrics)
 
     return results
 
 
+def get_precomputed_user_matches(vacancy_id: int, top_k: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """
+    Кандидаты для вакансии из vacancy_user_matches (см. app.precompute_matches).
+    None — если для вакансии нет предрасчёта, embedding вакансии или кого-то из
+    кандидатов изменился после него, или таблица предрасчёта недоступна
+    (миграция не выполнена) — тогда подбор идёт онлайн.
+    Пользователи, изменившиеся после предрасчёта и не попавшие в список,
+    вливаются в него следующим инкрементальным прогоном precompute_matches.
+    """
+    t_start = time.perf_counter()
+    try:
+        conn = get_conn()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            """
+            SELECT
+                u.id,
+                u.description,
+                m.score,
+                m.reranked,
+                m.computed_at >= COALESCE(v.embedded_at, m.computed_at)
+                    AND m.computed_at >= COALESCE(u.embedded_at, m.computed_at) AS fresh
+            FROM vacancy_user_matches m
+            JOIN messages v ON v.id = m.vacancy_id
+            JOIN main u ON u.id = m.main_id
+            WHERE m.vacancy_id = %s
+            ORDER BY m.score DESC
+            LIMIT %s;
+            """,
+            (vacancy_id, top_k)
+        )
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print("get_precomputed_user_matches: lookup unavailable:", e)
+        return None
+
+    if not rows or not all(r["fresh"] for r in rows):
+        return None
+
+    # score после rerank сравним с порогом онлайн-подбора, cosine — нет
+    results = [
+        {
+            "id": r["id"],
+            "description": r["description"],
+            "score": float(r["score"])
+        }
+        for r in rows
+        if not r["reranked"] or r["score"] >= 0.3
+    ]
+
+    print("get_precomputed_user_matches metrics:", {
+        "total_ms": (time.perf_counter() - t_start) * 1000,
+        "results_count": len(results),
+    })
+    return results
+
+
 def search_users_by_vacancy(vacancy_text: str, top_k: int = 20) -> List[Dict[str, Any]]:
     """
     По вакансии находит подходящих пользователей (кандидатов).
@@ -263,7 +608,11 @@ def search_users_by_vacancy(vacancy_text: str, top_k: int = 20) -> List[Dict[str
 
     # ---------- 0. НОРМАЛИЗАЦИЯ ВАКАНСИИ (как в embed_vacancies) ----------
     t0 = time.perf_counter()
-    normalized_data = normalize_vacancy_llm(vacancy_text)
+    # с NORMALIZATION_QUEUE — через воркеры app.normalization_worker, вне процесса API
+    normalized_data = normalization_queue.normalize(
+        vacancy_text,
+        priority=normalization_queue.PRIORITY_INTERACTIVE
+    )
     query_text = normalized_data_to_embedding_text(normalized_data) or normalize_vacancy(vacancy_text)
     metrics["normalize_ms"] = (time.perf_counter() - t0) * 1000
 
@@ -272,9 +621,64 @@ def search_users_by_vacancy(vacancy_text: str, top_k: int = 20) -> List[Dict[str
     vacancy_embedding = embedding_model.encode(
         f"query: {query_text}",
         normalize_embeddings=True
-    ).tolist()
+    )
     metrics["embedding_ms"] = (time.perf_counter() - t0) * 1000
 
+    return _match_users(query_text, vacancy_embedding, top_k, metrics, t_start, "search_users_by_vacancy")
+
+
+def search_users_by_stored_vacancy(vacancy_id: int, top_k: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """
+    То же, что search_users_by_vacancy, но для вакансии из messages:
+    берём сохранённые normalized и embedding вместо LLM-нормализации и encode.
+    None — если вакансии с таким id нет.
+    """
+    t_start = time.perf_counter()
+    metrics = {}
+
+    # ---------- 0. ЗАГРУЗКА СОХРАНЁННОЙ ВАКАНСИИ ----------
+    t0 = time.perf_counter()
+    conn = get_conn()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(
+        "SELECT content, normalized, embedding FROM messages WHERE id = %s",
+        (vacancy_id,)
+    )
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    metrics["load_ms"] = (time.perf_counter() - t0) * 1000
+
+    if row is None:
+        return None
+
+    query_text = normalized_data_to_embedding_text(row["normalized"]) or normalize_vacancy(row["content"] or "")
+
+    # ---------- 1. EMBEDDING ВАКАНСИИ ----------
+    # Сохранённый embedding посчитан с префиксом "passage: " (а не "query: ") —
+    # для поиска кандидатов этого достаточно, а encode выпадает из запроса
+    if row["embedding"] is not None:
+        vacancy_embedding = parse_pgvector(row["embedding"])
+    else:
+        t0 = time.perf_counter()
+        vacancy_embedding = embedding_model.encode(
+            f"query: {query_text}",
+            normalize_embeddings=True
+        )
+        metrics["embedding_ms"] = (time.perf_counter() - t0) * 1000
+
+    return _match_users(query_text, vacancy_embedding, top_k, metrics, t_start, "search_users_by_stored_vacancy")
+
+
+def _match_users(
+    query_text: str,
+    vacancy_embedding,
+    top_k: int,
+    metrics: Dict[str, Any],
+    t_start: float,
+    label: str
+) -> List[Dict[str, Any]]:
+    """Vector search по main + rerank профилей для уже нормализованной вакансии."""
     # ---------- 2. VECTOR SEARCH В POSTGRES (таблица users) ----------
     t0 = time.perf_counter()
     conn = get_conn()
@@ -285,7 +689,6 @@ def search_users_by_vacancy(vacancy_text: str, top_k: int = 20) -> List[Dict[str
         SELECT
             id,
             description,
-            embedding,
             embedding <=> %s::vector AS distance
         FROM main
         WHERE embedding IS NOT NULL
@@ -302,7 +705,7 @@ def search_users_by_vacancy(vacancy_text: str, top_k: int = 20) -> List[Dict[str
 
     if not rows:
         metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
-        print("search_users_by_vacancy metrics:", metrics)
+        print(f"{label} metrics:", metrics)
         return []
 
     # ---------- 3. RERANK: вакансия vs профили пользователей ----------
@@ -330,6 +733,6 @@ def search_users_by_vacancy(vacancy_text: str, top_k: int = 20) -> List[Dict[str
     metrics["total_ms"] = (time.perf_counter() - t_start) * 1000
     metrics["candidates_count"] = len(rows)
     metrics["results_count"] = len(results)
-    print("search_users_by_vacancy metrics:", metrics)
+    print(f"{label} metrics:", metrics)
 
     return results
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Кэш результатов поиска с инвалидацией по версии корпуса.
+
+Ключ — (функция поиска, нормализованный запрос, параметры, версия корпуса).
+Версия корпуса (таблица corpus_version, см. migrate_corpus_version) растёт при
+любом изменении messages; её значение перечитывается не чаще раза в
+CORPUS_VERSION_TTL_S секунд, при смене версии кэш сбрасывается целиком.
+
+Одновременные промахи по одному ключу схлопываются: считает первый запрос,
+остальные ждут его результата.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from app.db import get_conn
+
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 10000))
+CORPUS_VERSION_TTL_S = float(os.getenv("CORPUS_VERSION_TTL_S", 2))
+
+
+def normalize_query(text: str) -> str:
+    """Нормализация запроса для ключа кэша: регистр и пробелы не важны."""
+    return " ".join(text.lower().split())
+
+
+class _Flight:
+    """Вычисление, которое сейчас выполняет первый из одновременных запросов."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.ok = False
+
+
+class SearchCache:
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE, version_ttl_s: float = CORPUS_VERSION_TTL_S):
+        self.max_size = max_size
+        self.version_ttl_s = version_ttl_s
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "bypassed": 0}
+
+    def corpus_version(self) -> Optional[int]:
+        """Текущая версия корпуса; None — если её не удалось прочитать (кэш не используется)."""
+        now = time.monotonic()
+        if self._version is not None and now - self._version_checked_at < self.version_ttl_s:
+            return self._version
+
+        try:
+            conn = get_conn()
+            cur = conn.cursor()
+            cur.execute("SELECT version FROM corpus_version WHERE name = 'messages'")
+            row = cur.fetchone()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print("search_cache: corpus version unavailable:", e)
+            return None
+
+        version = row[0] if row else None
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+    def get_or_compute(
+        self,
+        name: str,
+        query: str,
+        compute: Callable[[], Tuple[Any, bool]],
+        timeout: Optional[float] = None,
+        **params
+    ) -> Tuple[Any, str]:
+        """
+        compute() -> (значение, можно_ли_кэшировать).
+        Возвращает (значение, статус): hit | miss | coalesced | bypass.
+        timeout — сколько ждать чужого вычисления того же ключа, секунды.
+        """
+        version = self.corpus_version()
+        if version is None:
+            self.stats["bypassed"] += 1
+            return compute()[0], "bypass"
+
+        key = (name, normalize_query(query), tuple(sorted(params.items())), version)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key], "hit"
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            if flight.event.wait(timeout) and flight.ok:
+                return flight.value, "coalesced"
+            # первый запрос не успел или упал — считаем сами
+            return compute()[0], "miss"
+
+        try:
+            value, cacheable = compute()
+            flight.value, flight.ok = value, True
+            if cacheable:
+                with self._lock:
+                    self._entries[key] = value
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                        self.stats["evictions"] += 1
+            return value, "miss"
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        return {
+            **stats,
+            "size": size,
+            "max_size": self.max_size,
+            "corpus_version": self._version,
+            "hit_ratio": (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0,
+        }
+
+
+search_cache = SearchCache()
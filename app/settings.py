@@ -1,4 +1,19 @@
+import os
+
 DEVICE = "cuda"
 EMBEDDING_MODEL = "intfloat/multilingual-e5-large"
 RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
 RERANKER_MODEL2 = "Qwen/Qwen3-Reranker-0.6B"
+
+# ---------- ОБЩИЙ INFERENCE-СЕРВЕР (app.inference_server) ----------
+# Unix-сокеты inference-серверов через запятую. Пусто — модели грузятся в каждом процессе.
+INFERENCE_SOCKETS = [p.strip() for p in os.getenv("INFERENCE_SOCKET", "").split(",") if p.strip()]
+# Обязателен: по сокету передаются pickle-сообщения, ключа по умолчанию нет
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY", "").encode()
+# Сколько ждать поднятия сервера (загрузка моделей занимает время), секунды
+INFERENCE_CONNECT_TIMEOUT = float(os.getenv("INFERENCE_CONNECT_TIMEOUT", 300))
+# Сколько ждать ответа на один вызов модели, секунды
+INFERENCE_CALL_TIMEOUT = float(os.getenv("INFERENCE_CALL_TIMEOUT", 60))
+# Выставляется самим inference-сервером: его модели всегда локальные
+INFERENCE_SERVER = os.getenv("INFERENCE_SERVER") == "1"
+USE_REMOTE_INFERENCE = bool(INFERENCE_SOCKETS) and not INFERENCE_SERVER
@@ -1,32 +1,53 @@
 import json
 import re
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import threading
+from app.settings import USE_REMOTE_INFERENCE
 
 MODEL_NAME = "Qwen/Qwen2.5-3B-Instruct"   # можно заменить на 3B
 
 # ---------- LOAD MODEL ----------
-tokenizer = AutoTokenizer.from_pretrained(
-    MODEL_NAME,
-    trust_remote_code=True
-)
-
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_NAME,
-    torch_dtype="auto",
-    device_map="auto",
-    trust_remote_code=True
-)
-
-generator = pipeline(
-    "text-generation",
-    model=model,
-    tokenizer=tokenizer,
-    max_new_tokens=512,
-    temperature=0.1,
-    do_sample=False,
-    return_full_text=False,  # только сгенерированный текст, без промпта
-)
+# Модель загружается при первой генерации: процессам, которым нужен только
+# normalized_data_to_embedding_text (precompute_matches и т.п.), LLM не нужна
+generator = None
+_load_lock = threading.Lock()
+
+if USE_REMOTE_INFERENCE:
+    # LLM живёт в общем inference-сервере (app.inference_server)
+    from app.inference_client import generate
+else:
+    def load_generator():
+        global generator
+        with _load_lock:
+            if generator is not None:
+                return generator
+
+            from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+
+            tokenizer = AutoTokenizer.from_pretrained(
+                MODEL_NAME,
+                trust_remote_code=True
+            )
+
+            model = AutoModelForCausalLM.from_pretrained(
+                MODEL_NAME,
+                torch_dtype="auto",
+                device_map="auto",
+                trust_remote_code=True
+            )
+
+            generator = pipeline(
+                "text-generation",
+                model=model,
+                tokenizer=tokenizer,
+                max_new_tokens=512,
+                temperature=0.1,
+                do_sample=False,
+                return_full_text=False,  # только сгенерированный текст, без промпта
+            )
+            return generator
+
+    def generate(prompt: str) -> str:
+        return load_generator()(prompt)[0]["generated_text"]
 
 # ---------- PROMPT TEMPLATE ----------
 PROMPT_TEMPLATE = """
@@ -67,7 +88,7 @@ def normalize_vacancy_llm(vacancy_text: str) -> dict:
         vacancy_text=vacancy_text.strip()
     )
 
-    result = generator(prompt)[0]["generated_text"]
+    result = generate(prompt)
     print("LLM response:", result)
 
     # ---------- EXTRACT JSON ----------